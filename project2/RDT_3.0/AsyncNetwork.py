@@ -0,0 +1,87 @@
+import asyncio
+import codecs
+import time
+import Network
+
+
+## Provides the NetworkLayer abstraction on top of asyncio streams.
+# The impairment parameters are inherited unchanged; the collector runs as
+# a task on the event loop instead of a thread, so one process can hold many
+# connections.
+class AsyncNetworkLayer(Network.NetworkLayer):
+
+    ##@param reader, writer: asyncio stream pair for an established connection
+    # @param impairment: as for NetworkLayer
+    def __init__(self, reader, writer, impairment=None):
+        self.reader = reader
+        self.writer = writer
+        self.impairment = impairment if impairment is not None else self.default_impairment()
+        self.loop = asyncio.get_running_loop()
+        self.byte_buffer = bytearray()
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.data_ready = asyncio.Event()
+        self.stop = False
+        self.collect_thread = None
+        self.collect_task = asyncio.ensure_future(self.collect())
+
+    ## connect to a server and return the network layer for the connection
+    @classmethod
+    async def open_connection(cls, server_S, port):
+        reader, writer = await asyncio.open_connection(server_S, port)
+        return cls(reader, writer)
+
+    ## accept connections on port, calling session(network) for each one
+    # @return the asyncio.Server, use serve_forever() or close() on it
+    @classmethod
+    async def start_server(cls, port, session):
+        async def on_connect(reader, writer):
+            await session(cls(reader, writer))
+        return await asyncio.start_server(on_connect, 'localhost', port)
+
+    def udt_send(self, msg_S):
+        self.impairment.send(msg_S, self._transmit, self._defer)
+
+    ## delayed packets are written from the event loop rather than a TimerWheel thread
+    def _defer(self, due, fn):
+        self.loop.call_later(max(0, due - time.monotonic()), fn)
+
+    def disconnect(self):
+        self.stop = True
+        self.collect_task.cancel()
+        self.writer.close()
+
+    def __del__(self):
+        pass #the stream owns the socket
+
+    ## write msg_S (str or bytes) to the connection, flow control is left to the transport
+    def _transmit(self, msg_S):
+        if not self.writer.is_closing():
+            self.writer.write(msg_S.encode('utf-8') if isinstance(msg_S, str) else msg_S)
+
+    ## Receive data from the network and save in internal buffer
+    async def collect(self):
+        try:
+            while not self.stop:
+                recv_bytes = await self.reader.read(2048)
+                if not recv_bytes:
+                    break #connection closed by the peer
+                self.byte_buffer += recv_bytes
+                self.data_ready.set()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        self.stop = True
+        self.data_ready.set()
+
+    ## Deliver collected data to client, a coroutine unlike NetworkLayer.udt_receive
+    # @param timeout: seconds to wait for data if none is buffered;
+    #  0 returns immediately, None waits until data arrives or the connection closes
+    async def udt_receive(self, timeout=0):
+        if not self.byte_buffer and not self.stop and timeout != 0:
+            try:
+                await asyncio.wait_for(self.data_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        ret_B = bytes(self.byte_buffer)
+        del self.byte_buffer[:]
+        self.data_ready.clear()
+        return ret_B if self.binary else self.decoder.decode(ret_B)
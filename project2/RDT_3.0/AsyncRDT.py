@@ -0,0 +1,126 @@
+import asyncio
+import AsyncNetwork
+from RDT import Packet, RDT
+
+
+## rdt 3.0 on an asyncio event loop.
+# Speaks the same wire protocol as RDT.rdt_3_0_send/rdt_3_0_receive, so an
+# AsyncRDT server can talk to the threaded Client.py. A single dispatch task
+# parses everything arriving on the connection and the retransmit timer is a
+# loop.call_later callback, so there are no threads and no polling.
+class AsyncRDT:
+   ## latest sequence number used in a packet
+   seq_num = 1
+   ## buffer of bytes read from network
+   byte_buffer = b''
+   ## seconds to wait for an ACK before retransmitting
+   time_allowed = RDT.time_allowed
+
+   ##@param network: a connected AsyncNetwork.AsyncNetworkLayer
+   def __init__(self, network):
+      self.network = network
+      self.network.binary = True #Packet parses raw bytes
+      self.loop = asyncio.get_running_loop()
+      self.msg_queue = asyncio.Queue() #delivered messages, None once the connection closes
+      self.in_flight = None #Packet waiting for an ACK
+      self.ack_future = None #resolved when in_flight is acknowledged
+      self.timer = None #retransmit timer handle
+      self.dispatch_task = asyncio.ensure_future(self.dispatch())
+
+   ## connect to a server and return an AsyncRDT for the connection
+   @classmethod
+   async def connect(cls, server_S, port):
+      return cls(await AsyncNetwork.AsyncNetworkLayer.open_connection(server_S, port))
+
+   ## accept connections on port, running session(rdt) as a task for each one
+   # @return the asyncio.Server, use serve_forever() or close() on it
+   @classmethod
+   async def start_server(cls, port, session):
+      async def on_connect(network):
+         await session(cls(network))
+      return await AsyncNetwork.AsyncNetworkLayer.start_server(port, on_connect)
+
+   def disconnect(self):
+      if self.timer is not None:
+         self.timer.cancel()
+      self.dispatch_task.cancel()
+      self.network.disconnect()
+
+   ## parse packets as they arrive and hand them to _handle
+   async def dispatch(self):
+      try:
+         while not self.network.stop:
+            self.byte_buffer += await self.network.udt_receive(None)
+            pkt_L, self.byte_buffer = Packet.split_byte_S(self.byte_buffer)
+            for p in pkt_L:
+               self._handle(p)
+      finally:
+         #connection is gone - wake up anyone waiting on it
+         if self.timer is not None:
+            self.timer.cancel()
+         if self.ack_future is not None and not self.ack_future.done():
+            self.ack_future.set_exception(ConnectionError('connection closed'))
+         self.msg_queue.put_nowait(None)
+
+   def _handle(self, p):
+      if p is None:
+         #corrupt: resend what we have in flight, otherwise ask the peer to resend
+         if self.in_flight is not None:
+            self._retransmit()
+         else:
+            self.network.udt_send(Packet(self.seq_num, "NAK").get_byte_S())
+      elif p.msg_S == "ACK":
+         if self.in_flight is not None and p.seq_num == self.in_flight.seq_num:
+            self._acknowledged()
+      elif p.msg_S == "NAK":
+         if self.in_flight is not None:
+            self._retransmit()
+      elif p.seq_num < self.seq_num:
+         #duplicate, our ACK must have been lost
+         self.network.udt_send(Packet(p.seq_num, "ACK").get_byte_S())
+      else:
+         #the peer only sends its next data packet once it has ours, so that acknowledges
+         #what we have in flight, as with a peer that delays its ACK to piggyback it
+         if self.in_flight is not None and p.seq_num == self.in_flight.seq_num + 1:
+            self._acknowledged()
+         if p.seq_num == self.seq_num and self.in_flight is None:
+            self.network.udt_send(Packet(p.seq_num, "ACK").get_byte_S())
+            self.seq_num += 1
+            self.msg_queue.put_nowait(p.msg_S)
+
+   ## the packet in flight got through: stop its timer and let rdt_3_0_send return
+   def _acknowledged(self):
+      self.timer.cancel()
+      self.in_flight = None
+      self.seq_num += 1
+      self.ack_future.set_result(None)
+
+   ## (re)send the packet in flight and rearm the retransmit timer
+   def _retransmit(self):
+      if self.timer is not None:
+         self.timer.cancel()
+      if self.network.stop:
+         return #dispatch has failed ack_future, and no ACK can arrive any more
+      self.network.udt_send(self.in_flight.get_byte_S())
+      self.timer = self.loop.call_later(self.time_allowed, self._retransmit)
+
+   ## send msg_S, returning once the peer has acknowledged it
+   # @raise ConnectionError if the connection is or gets closed first
+   async def rdt_3_0_send(self, msg_S):
+      if self.network.stop or self.dispatch_task.done():
+         raise ConnectionError('connection closed')
+      self.in_flight = Packet(self.seq_num, msg_S)
+      self.ack_future = self.loop.create_future()
+      self._retransmit()
+      await self.ack_future
+
+   ## @param timeout: seconds to wait for a message, None waits forever
+   # @return the next message, or None on timeout or once the connection is closed
+   async def rdt_3_0_receive(self, timeout=None):
+      try:
+         msg_S = await asyncio.wait_for(self.msg_queue.get(), timeout)
+      except asyncio.TimeoutError:
+         return None
+      if msg_S is None:
+         self.msg_queue.put_nowait(None) #keep reporting the closed connection
+      return msg_S
@@ -1,12 +1,59 @@
 import argparse
+import logging
+import Network
 import RDT
 import time
 
+##configuration parameters
+ack_delay = 0.05 #hold ACKs this long so they can ride on the next request instead of going out alone
+
+
+## convert msg_L with up to depth requests outstanding, so the round trip time is paid once
+# rather than once per message. Talks to Server.py --pipeline: each request is an 'id:message'
+# line over Selective Repeat and replies are matched back to requests by id.
+# @param timeout: give up if no reply arrives for this many seconds
+# @return list of replies in the order of msg_L, None for any that never came
+def converse_pipelined(rdt, msg_L, depth, timeout):
+    reply_D = {}
+    next_id = 0
+    pending_S = '' #a reply split across receives
+    time_of_last_data = time.time()
+    while len(reply_D) < len(msg_L):
+        while next_id < len(msg_L) and next_id - len(reply_D) < depth:
+            rdt.rdt_sr_send('%d:%s\n' % (next_id, msg_L[next_id]))
+            next_id += 1
+        data_S = rdt.rdt_sr_receive(time_of_last_data + timeout - time.time())
+        if data_S is None:
+            #the replies still missing will never come once the server has closed the connection
+            if time_of_last_data + timeout < time.time() or rdt.network.stop:
+                break
+            else:
+                continue
+        time_of_last_data = time.time()
+        *line_L, pending_S = (pending_S + data_S).split('\n')
+        for line in line_L:
+            id_S, reply_S = line.split(':', 1)
+            reply_D[int(id_S)] = reply_S
+    return [reply_D.get(i) for i in range(len(msg_L))]
+
+
 if __name__ == '__main__':
     parser =  argparse.ArgumentParser(description='Quotation client talking to a Pig Latin server.')
     parser.add_argument('server', help='Server.')
     parser.add_argument('port', help='Port.', type=int)
+    parser.add_argument('--file', help='Convert the quotations in this file, one per line.', default=None)
+    parser.add_argument('--pipeline', help='Keep this many requests outstanding (needs Server.py --pipeline).', type=int, default=None)
+    parser.add_argument('--protocol', help='Protocol version to speak without --pipeline (the server must match).', choices=list(RDT.protocol_D), default='3.0')
+    parser.add_argument('--transport', help='Run RDT over TCP or straight over UDP (the server must match).', choices=['tcp', 'udp'], default='tcp')
+    parser.add_argument('--coalesce', help='Batch writes, holding packets up to this many seconds (see NetworkLayer.coalesce_delay).', type=float, default=None)
+    parser.add_argument('--log-level', help='Show protocol events down to this level, DEBUG for every packet.', choices=['DEBUG', 'INFO', 'WARNING'], default='INFO')
+    parser.add_argument('--stats', help='Print the connection statistics at the end.', action='store_true')
     args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    Network.NetworkLayer.coalesce_delay = args.coalesce
+    #pipelining sends streams of small packets, which Nagle would hold back waiting for an ACK
+    #that the peer's TCP in turn delays, stalling every exchange for tens of milliseconds
+    Network.NetworkLayer.nodelay = args.pipeline is not None
     
     msg_L = ['The use of COBOL cripples the mind; its teaching should, therefore, be regarded as a criminal offense. -- Edsgar Dijkstra',
             'C makes it easy to shoot yourself in the foot; C++ makes it harder, but when you do, it blows away your whole leg. -- Bjarne Stroustrup',
@@ -15,29 +62,54 @@ if __name__ == '__main__':
             'Wise men make proverbs, but fools repeat them. -- Samuel Palmer (1805-80)']
     
      
+    if args.file is not None:
+        with open(args.file) as quote_file:
+            msg_L = [line.rstrip('\n') for line in quote_file if line.strip()]
+     
     timeout = 120 #send the next message if no response
     time_of_last_data = time.time()
      
-    rdt = RDT.RDT('client', args.server, args.port)
-    for msg_S in msg_L:
-        print('Converting: '+msg_S)
-        #rdt.rdt_2_1_send(msg_S)
-        rdt.rdt_3_0_send(msg_S)
+    if args.pipeline is not None:
+        rdt = RDT.RDT('client', args.server, args.port, window_size=args.pipeline, transport=args.transport)
+        start = time.time()
+        reply_L = converse_pipelined(rdt, msg_L, args.pipeline, timeout)
+        for msg_S, reply_S in zip(msg_L, reply_L):
+            print('Converting: '+msg_S)
+            if reply_S is not None:
+                print('to: '+reply_S+'\n')
+        print('%d messages in %.2f s' % (len(msg_L), time.time() - start))
+        if not rdt.network.stop:
+            rdt.rdt_sr_flush()
+        if args.stats:
+            print(rdt.get_stats())
+        rdt.disconnect()
+    else:
+        rdt = RDT.RDT('client', args.server, args.port, ack_delay=ack_delay, protocol=args.protocol, transport=args.transport)
+        for msg_S in msg_L:
+            print('Converting: '+msg_S)
+            rdt.send(msg_S)
        
-        # try to receive message before timeout 
-        msg_S = None
-        while msg_S == None:
-            #msg_S = rdt.rdt_2_1_receive()
-            msg_S = rdt.rdt_3_0_receive()
-            if msg_S is None:
-                if time_of_last_data + timeout < time.time():
-                    break
-                else:
-                    continue
-        time_of_last_data = time.time()
+            # try to receive message before timeout 
+            msg_S = None
+            while msg_S == None:
+                msg_S = rdt.receive(time_of_last_data + timeout - time.time())
+                if msg_S is None:
+                    #receive no longer blocks once the server has closed the connection
+                    if time_of_last_data + timeout < time.time() or rdt.network.stop:
+                        break
+                    else:
+                        continue
+            if msg_S is None and rdt.network.stop:
+                print('Server closed the connection')
+                break
+            time_of_last_data = time.time()
         
-        #print the result
-        if msg_S:
-            print('to: '+msg_S+'\n')
+            #print the result
+            if msg_S:
+                print('to: '+msg_S+'\n')
         
-    rdt.disconnect()
+        if not rdt.network.stop:
+            rdt.flush()
+        if args.stats:
+            print(rdt.get_stats())
+        rdt.disconnect()
@@ -0,0 +1,71 @@
+import argparse
+import contextlib
+import io
+import threading
+import time
+import Network
+import RDT
+
+
+## receive until message_count messages have arrived, then keep acknowledging until the sender is done
+def sink(rdt, message_count, done):
+    received = 0
+    while received < message_count and not rdt.network.stop:
+        msg_S = rdt.receive(0.1)
+        if msg_S is not None:
+            received += msg_S.count(';')
+    while not done.is_set() and not rdt.network.stop:
+        rdt.receive(0.1)
+
+## send message_count messages of size characters as fast as the protocol allows
+# @param protocol: 'gbn' or 'sr'
+# @param congestion: key of RDT.congestion_D
+# @return (goodput in bytes per second, sender's RDT statistics)
+def measure(protocol, congestion, loss, transport, port, message_count, size, window_size):
+    Network.NetworkLayer.prob_pkt_loss = loss
+    done = threading.Event()
+    server_L = []
+    def server():
+        server_L.append(RDT.RDT('server', None, port, transport=transport, protocol=protocol, window_size=window_size, congestion=congestion))
+        sink(server_L[0], message_count, done)
+    msg_S = 'x' * (size - 1) + ';'
+    with contextlib.redirect_stdout(io.StringIO()):
+        server_thread = threading.Thread(name='Server', target=server)
+        server_thread.start()
+        time.sleep(0.2) #let the server start listening
+        rdt = RDT.RDT('client', 'localhost', port, transport=transport, protocol=protocol, window_size=window_size, congestion=congestion)
+        start = time.time()
+        for i in range(message_count):
+            rdt.send(msg_S)
+        rdt.flush()
+        elapsed = time.time() - start
+        done.set()
+        server_thread.join()
+        rdt.disconnect()
+        server_L[0].disconnect()
+    return message_count * size / elapsed, rdt.get_stats()
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Goodput of the windowed senders against packet loss, with and without congestion control.')
+    parser.add_argument('--port', help='Port, also the loopback rendezvous key.', type=int, default=5000)
+    parser.add_argument('--messages', help='Messages per measurement.', type=int, default=2000)
+    parser.add_argument('--size', help='Message size in characters.', type=int, default=1000)
+    parser.add_argument('--window', help='Sender window_size.', type=int, default=64)
+    parser.add_argument('--losses', help='prob_pkt_loss values to try.', type=float, nargs='+', default=[0, 0.01, 0.02, 0.05, 0.1])
+    parser.add_argument('--protocols', help='Windowed protocols to try.', choices=['gbn', 'sr'], nargs='+', default=['gbn', 'sr'])
+    parser.add_argument('--congestion', help='Congestion controllers to try.', choices=list(RDT.congestion_D), nargs='+', default=list(RDT.congestion_D))
+    parser.add_argument('--transport', help='Transport.', choices=list(Network.transport_D), default='loopback')
+    parser.add_argument('--seed', help='Seed for the loss pattern, the same for every measurement.', type=int, default=466)
+    args = parser.parse_args()
+    Network.NetworkLayer.seed = args.seed
+
+    print('%-5s  %-8s  %-5s  %12s  %15s  %9s  %9s' % ('loss', 'protocol', 'cc', 'goodput kB/s', 'retransmits/msg', 'timeouts', 'fast rtx'))
+    port = args.port
+    for loss in args.losses:
+        for protocol in args.protocols:
+            for congestion in args.congestion:
+                goodput, stats_D = measure(protocol, congestion, loss, args.transport, port, args.messages, args.size, args.window)
+                port += 1
+                print('%-5g  %-8s  %-5s  %12.0f  %15.2f  %9d  %9s' % (loss, protocol, congestion, goodput / 1e3, stats_D['retransmits'] / args.messages,
+                                                                     stats_D['timeouts'], stats_D['congestion'].get('fast_retransmits', '-')))
@@ -0,0 +1,218 @@
+import math
+import random
+import threading
+import time
+
+
+## Impairs the packets a NetworkLayer sends, so protocols can be tested against a misbehaving network.
+# A packet passes through each stage in turn as a list of (due, msg_S) items, where due is the
+# time.monotonic() at which it should reach the socket. Stages may drop items, change them, hold
+# them back or push their due time out. Every random choice comes from one random.Random, so two
+# pipelines built with the same seed impair the same sequence of sends in exactly the same way.
+class ImpairmentPipeline:
+
+    ##@param stages: stage objects applied in order, see Loss, GilbertElliott, Corrupt, Reorder, Delay, Bandwidth
+    # @param seed: seed for the pipeline's random number generator, None for a different run every time
+    def __init__(self, stages=(), seed=None):
+        self.stages = list(stages)
+        self.rng = random.Random(seed)
+
+    ## the pipeline NetworkLayer has always had: independent loss, corruption and one-deep reordering
+    # @param corrupt_skip: leading bytes Corrupt leaves alone, i.e. the packet length field
+    @classmethod
+    def from_probabilities(cls, prob_pkt_loss=0, prob_byte_corr=0, prob_pkt_reorder=0, seed=None, corrupt_skip=0):
+        stages = []
+        if prob_pkt_loss:
+            stages.append(Loss(prob_pkt_loss))
+        if prob_byte_corr:
+            stages.append(Corrupt(prob_byte_corr, corrupt_skip))
+        if prob_pkt_reorder:
+            stages.append(Reorder(prob_pkt_reorder))
+        return cls(stages, seed)
+
+    ## run msg_S through the stages and pass whatever comes out on
+    # @param transmit: transmit(msg_S) writes a packet to the connection
+    # @param defer: defer(due, fn) calls fn() at time.monotonic() due, for packets that are not due yet
+    def send(self, msg_S, transmit, defer):
+        item_L = [(time.monotonic(), msg_S)]
+        for stage in self.stages:
+            item_L = stage.apply(item_L, self.rng)
+        now = time.monotonic()
+        for due, msg_S in item_L:
+            if due <= now:
+                transmit(msg_S)
+            else:
+                defer(due, lambda msg_S=msg_S: transmit(msg_S))
+
+
+## Drops each packet independently with probability prob.
+class Loss:
+
+    def __init__(self, prob):
+        self.prob = prob
+
+    def apply(self, item_L, rng):
+        return [item for item in item_L if rng.random() >= self.prob]
+
+
+## Two-state burst loss: the channel moves between a good and a bad state before each packet,
+# and drops it with that state's loss probability. The mean burst lasts 1/prob_bad_to_good packets.
+class GilbertElliott:
+
+    ##@param prob_good_to_bad, prob_bad_to_good: per-packet state transition probabilities
+    # @param loss_good, loss_bad: loss probability in each state, 0 and 1 give the plain Gilbert model
+    def __init__(self, prob_good_to_bad, prob_bad_to_good, loss_good=0, loss_bad=1):
+        self.prob_good_to_bad = prob_good_to_bad
+        self.prob_bad_to_good = prob_bad_to_good
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def apply(self, item_L, rng):
+        out_L = []
+        for item in item_L:
+            if rng.random() < (self.prob_bad_to_good if self.bad else self.prob_good_to_bad):
+                self.bad = not self.bad
+            if rng.random() >= (self.loss_bad if self.bad else self.loss_good):
+                out_L.append(item)
+        return out_L
+
+
+## Overwrites 1 to 5 characters of a packet with 'X', with probability prob.
+class Corrupt:
+
+    ##@param skip: leading bytes to leave alone - corrupting the length field makes life really difficult
+    def __init__(self, prob, skip=0):
+        self.prob = prob
+        self.skip = skip
+
+    def apply(self, item_L, rng):
+        out_L = []
+        for due, msg_S in item_L:
+            if rng.random() < self.prob:
+                start = rng.randint(self.skip, max(self.skip, len(msg_S)-5))
+                num = rng.randint(1,5)
+                repl_S = 'X' * num
+                if not isinstance(msg_S, str):
+                    repl_S = repl_S.encode('utf-8')
+                msg_S = msg_S[:start]+repl_S+msg_S[start+num:]
+            out_L.append((due, msg_S))
+        return out_L
+
+
+## Holds a packet back, with probability prob, until depth later packets have gone past it.
+# A held packet only moves on when something else is sent, as with the old one-deep reordering.
+class Reorder:
+
+    def __init__(self, prob, depth=1):
+        self.prob = prob
+        self.depth = depth
+        self.held_L = [] #[packets still to let past, item]
+
+    def apply(self, item_L, rng):
+        out_L = []
+        for item in item_L:
+            if rng.random() < self.prob:
+                self.held_L.append([self.depth, item])
+                continue
+            out_L.append(item)
+            for held in self.held_L:
+                held[0] -= 1
+            #released packets go out now, behind the ones that overtook them
+            out_L += [(item[0], held[1][1]) for held in self.held_L if held[0] <= 0]
+            self.held_L = [held for held in self.held_L if held[0] > 0]
+        return out_L
+
+
+## Delays every packet by delay seconds, plus a uniform random jitter of up to jitter seconds.
+# Jitter larger than the gap between packets reorders them.
+class Delay:
+
+    def __init__(self, delay, jitter=0):
+        self.delay = delay
+        self.jitter = jitter
+
+    def apply(self, item_L, rng):
+        return [(due + self.delay + (rng.uniform(0, self.jitter) if self.jitter else 0), msg_S) for due, msg_S in item_L]
+
+
+## Limits the link to bytes_per_sec: each packet waits for the ones before it to be clocked out.
+class Bandwidth:
+
+    def __init__(self, bytes_per_sec):
+        self.bytes_per_sec = bytes_per_sec
+        self.link_free = 0 #time.monotonic() the last queued packet finishes sending
+
+    def apply(self, item_L, rng):
+        out_L = []
+        for due, msg_S in item_L:
+            self.link_free = max(due, self.link_free) + len(msg_S) / self.bytes_per_sec
+            out_L.append((self.link_free, msg_S))
+        return out_L
+
+
+## Hashed timing wheel: calls functions at a given time.monotonic() with tick resolution.
+# Scheduling is O(1) however many packets are in flight, and one thread serves them all;
+# functions due in the same tick run in the order they were scheduled.
+class TimerWheel:
+
+    ##@param tick: resolution in seconds
+    # @param slots: number of buckets; timers further out than slots*tick wait extra turns of the wheel
+    def __init__(self, tick=0.001, slots=512):
+        self.tick = tick
+        self.slot_L = [[] for i in range(slots)]
+        self.pending = 0
+        self.closed = False
+        self.cursor = math.floor(time.monotonic() / tick) #last tick processed
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(name='TimerWheel', target=self.run, daemon=True)
+        self.thread.start()
+
+    ## call fn() at time.monotonic() due, or on the next tick if that has passed
+    def schedule(self, due, fn):
+        with self.cond:
+            if not self.pending:
+                self.cursor = math.floor(time.monotonic() / self.tick) #idle wheel, catch up in one step
+            tick_n = max(math.ceil(due / self.tick), self.cursor + 1)
+            self.slot_L[tick_n % len(self.slot_L)].append((tick_n, fn))
+            self.pending += 1
+            self.cond.notify()
+
+    ## stop the wheel
+    # @param drain: first wait until every scheduled function has run
+    def close(self, drain=True):
+        with self.cond:
+            if drain:
+                self.cond.wait_for(lambda: not self.pending)
+            self.closed = True
+            self.cond.notify_all()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                #sleep until the next tick, or indefinitely while nothing is scheduled
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if self.closed:
+                    return
+                wait = (self.cursor + 1) * self.tick - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                now_tick = math.floor(time.monotonic() / self.tick)
+                due_L = []
+                while self.cursor < now_tick:
+                    self.cursor += 1
+                    slot = self.slot_L[self.cursor % len(self.slot_L)]
+                    due_L += [fn for tick_n, fn in slot if tick_n <= self.cursor]
+                    slot[:] = [entry for entry in slot if entry[0] > self.cursor]
+                    if len(due_L) == self.pending:
+                        self.cursor = now_tick #nothing left anywhere, skip the empty slots
+            for fn in due_L:
+                try:
+                    fn()
+                except (OSError, RuntimeError):
+                    pass #connection went away while the packet was in flight
+            with self.cond:
+                self.pending -= len(due_L)
+                self.cond.notify_all()
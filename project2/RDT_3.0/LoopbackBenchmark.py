@@ -0,0 +1,68 @@
+import argparse
+import contextlib
+import io
+import statistics
+import threading
+import time
+import Network
+import RDT
+
+
+## echo every message straight back until the client is done
+def echo(rdt, done):
+    while not done.is_set() and not rdt.network.stop:
+        msg_S = rdt.receive(0.1)
+        if msg_S is not None:
+            rdt.send(msg_S)
+
+## send message_count messages one at a time, waiting for each echo
+# @param protocol: key of RDT.protocol_D
+# @return (messages per second, list of round trip times in seconds)
+def measure(protocol, transport, port, message_count, packet_format, ack_delay=0):
+    done = threading.Event()
+    server_L = []
+    def server():
+        server_L.append(RDT.RDT('server', None, port, packet_format=packet_format, transport=transport, protocol=protocol, ack_delay=ack_delay))
+        echo(server_L[0], done)
+    with contextlib.redirect_stdout(io.StringIO()):
+        server_thread = threading.Thread(name='Server', target=server)
+        server_thread.start()
+        time.sleep(0.2) #let the server start listening
+        rdt = RDT.RDT('client', 'localhost', port, packet_format=packet_format, transport=transport, protocol=protocol, ack_delay=ack_delay)
+        rtt_L = []
+        start = time.time()
+        for i in range(message_count):
+            sent = time.time()
+            rdt.send('message %d;' % i)
+            while rdt.receive(1) is None:
+                pass
+            rtt_L.append(time.time() - sent)
+        elapsed = time.time() - start
+        rdt.flush()
+        done.set()
+        server_thread.join()
+        rdt.disconnect()
+        server_L[0].disconnect()
+    return message_count / elapsed, rtt_L
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Echo throughput and latency of every rdt version over each transport.')
+    parser.add_argument('--port', help='Port, also the loopback rendezvous key.', type=int, default=5000)
+    parser.add_argument('--messages', help='Messages per measurement.', type=int, default=5000)
+    parser.add_argument('--format', help='Packet format.', choices=['string', 'binary'], default='string')
+    parser.add_argument('--protocols', help='Protocol versions to try.', choices=list(RDT.protocol_D), nargs='+', default=list(RDT.protocol_D))
+    parser.add_argument('--transports', help='Transports to try.', choices=list(Network.transport_D), nargs='+', default=['loopback'])
+    parser.add_argument('--ack-delay', help='Delayed ACK timeout of both ends, see RDT ack_delay.', type=float, default=0)
+    parser.add_argument('--nodelay', help='Disable Nagle on TCP, see NetworkLayer.nodelay.', action='store_true')
+    args = parser.parse_args()
+    Network.NetworkLayer.nodelay = args.nodelay
+
+    print('%-8s  %-8s  %10s  %8s  %8s  %8s' % ('protocol', 'transport', 'messages/s', 'p50 us', 'p90 us', 'p99 us'))
+    port = args.port
+    for transport in args.transports:
+        for protocol in args.protocols:
+            rate, rtt_L = measure(protocol, transport, port, args.messages, args.format, args.ack_delay)
+            port += 1
+            q_L = statistics.quantiles(rtt_L, n=100)
+            print('%-8s  %-8s  %10.0f  %8.1f  %8.1f  %8.1f' % (protocol, transport, rate, q_L[49]*1e6, q_L[89]*1e6, q_L[98]*1e6))
@@ -1,10 +1,15 @@
 import argparse
+import codecs
+import logging
 import socket
 import threading
+import time
 from time import sleep
-import random
+import Impairment
 import RDT
 
+logger = logging.getLogger('Network')
+
 
 
 ## Provides an abstraction for the network layer
@@ -13,41 +18,99 @@ class NetworkLayer:
     prob_pkt_loss = 0
     prob_byte_corr = 0 #0.15
     prob_pkt_reorder = 0
+    seed = None #seed for the impairment RNG, set it to repeat a run's losses exactly
+    coalesce_delay = None #hold packets up to this many seconds and write them in one call, None writes each at once
+    coalesce_size = 65536 #write held packets at once when this many bytes are waiting
+    iov_max = 1024 #buffers per sendmsg call
+    nodelay = False #disable Nagle, so a small packet is not held back until the previous one is acknowledged
+    ## deliver raw bytes from udt_receive instead of decoded text
+    binary = False
     
     #class variables
     sock = None
     conn = None
-    buffer_S = ''
-    lock = threading.Lock()
+    byte_buffer = None #bytearray the collector appends to
+    recv_size = 65536 #bytes read per recv_into call
+    buffer_limit = 1048576 #stop reading the connection while this many bytes wait for udt_receive
+    decoder = None #incremental UTF-8 decoder, so characters split across recv() calls survive
+    lock = None
+    data_ready = None #signalled by the collector whenever byte_buffer grows
     collect_thread = None
     stop = None
-    socket_timeout = 0.1
-    reorder_msg_S = None
+    impairment = None #Impairment.ImpairmentPipeline applied to everything we send
+    timer_wheel = None #sends packets the impairment has delayed, started on first use
+    send_lock = None #udt_send is also called from ACK timers, and delayed packets are written by the timer wheel
+    out_L = None #encoded packets held back by coalescing
+    out_size = 0
+    packets_sent = 0 #packets handed to the connection
+    send_calls = 0 #send/sendmsg system calls made for them
+    bytes_sent = 0
+    recv_calls = 0 #recv_into system calls made by the collector
+    bytes_received = 0
     
-    def __init__(self, role_S, server_S, port):
-        if role_S == 'client':
-            print('Network: role is client')
+    ##@param conn: an already accepted connection (see NetworkListener), role_S is then ignored
+    # @param impairment: Impairment.ImpairmentPipeline to use instead of one built from the
+    #  prob_* parameters and seed
+    def __init__(self, role_S, server_S, port, conn=None, impairment=None):
+        if conn is not None:
+            self.conn = conn
+
+        elif role_S == 'client':
+            logger.info('Network: role is client')
             self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.conn.connect((server_S, port))
-            self.conn.settimeout(self.socket_timeout)
             
         elif role_S == 'server':
-            print('Network: role is server')
+            logger.info('Network: role is server')
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.bind(('localhost', port))
             self.sock.listen(1)
             self.conn, addr = self.sock.accept()
-            self.conn.settimeout(self.socket_timeout)
         
+        if (self.coalesce_delay is not None or self.nodelay) and self.conn.type == socket.SOCK_STREAM:
+            #with coalescing we do our own batching, so the kernel should not hold writes back as well
+            self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.coalesce_delay is not None:
+            self.out_L = []
+        self.impairment = impairment if impairment is not None else self.default_impairment()
+        self.send_lock = threading.RLock()
+        self.byte_buffer = bytearray()
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.lock = threading.Lock()
+        self.data_ready = threading.Condition(self.lock)
         #start the thread to receive data on the connection
         self.collect_thread = threading.Thread(name='Collector', target=self.collect)
         self.stop = False
         self.collect_thread.start()
         
 
+    ## @return dictionary of the connection's counters
+    def get_stats(self):
+        return {'packets_sent': self.packets_sent, 'send_calls': self.send_calls, 'bytes_sent': self.bytes_sent,
+                'recv_calls': self.recv_calls, 'bytes_received': self.bytes_received}
+
+    ## the impairment pipeline configured by the class parameters
+    def default_impairment(self):
+        #never corrupt the length field, since that makes life really difficult
+        return Impairment.ImpairmentPipeline.from_probabilities(self.prob_pkt_loss, self.prob_byte_corr, self.prob_pkt_reorder,
+                                                                self.seed, RDT.Packet.length_S_length)
+
     def disconnect(self):
+        if self.timer_wheel is not None:
+            self.timer_wheel.close() #let delayed packets still in flight arrive
+        try:
+            self.flush()
+        except (OSError, RuntimeError):
+            pass #peer already closed the connection
         if self.collect_thread:
-            self.stop = True
+            with self.data_ready:
+                self.stop = True
+                self.data_ready.notify_all()
+            #wake the collector out of its blocking recv
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass #peer already closed the connection
             self.collect_thread.join()
         
 
@@ -57,58 +120,323 @@ class NetworkLayer:
 
         
     def udt_send(self, msg_S):
-        #return without sending if the packet is being dropped
-        if random.random() < self.prob_pkt_loss:
-            return
-        #corrupt a packet
-        if random.random() < self.prob_byte_corr:
-            start = random.randint(RDT.Packet.length_S_length,len(msg_S)-5) #make sure we are not corrupting the length field, 
-                                                                            #since that makes life really difficult
-            num = random.randint(1,5)
-            repl_S = ''.join(random.sample('XXXXX', num)) #sample length >= num
-            msg_S = msg_S[:start]+repl_S+msg_S[start+num:]
-        #reorder packets - either hold a packet back, or if one held back then send both
-        if random.random() < self.prob_pkt_reorder or self.reorder_msg_S:
-            if self.reorder_msg_S is None:
-                self.reorder_msg_S = msg_S
-                return None
-            else:
-                msg_S += self.reorder_msg_S
-                self.reorder_msg_S = None
-                
+        with self.send_lock:
+            self.impairment.send(msg_S, self._transmit, self._defer)
+
+    ## call fn() at time.monotonic() due, for packets the impairment delays
+    def _defer(self, due, fn):
+        if self.timer_wheel is None:
+            self.timer_wheel = Impairment.TimerWheel()
+        self.timer_wheel.schedule(due, fn)
+
+    ## write msg_S (str or bytes) to the connection, or queue it if coalescing
+    def _transmit(self, msg_S):
+        msg_B = msg_S.encode('utf-8') if isinstance(msg_S, str) else msg_S
+        with self.send_lock:
+            self.packets_sent += 1
+            self.bytes_sent += len(msg_B)
+            if self.out_L is None:
+                self._write([msg_B])
+                return
+            self.out_L.append(msg_B)
+            self.out_size += len(msg_B)
+            if self.out_size >= self.coalesce_size:
+                self.flush()
+            elif len(self.out_L) == 1:
+                self._defer(time.monotonic() + self.coalesce_delay, self.flush)
+
+    ## write any packets held back by coalescing
+    def flush(self):
+        with self.send_lock:
+            if self.out_L:
+                out_L = self.out_L
+                self.out_L = []
+                self.out_size = 0
+                self._write(out_L)
+
+    ## write a list of byte strings to the connection, as few system calls as the socket allows
+    def _write(self, buf_L):
         #keep calling send until all the bytes are transferred
-        totalsent = 0
-        while totalsent < len(msg_S):
-            sent = self.conn.send(msg_S[totalsent:].encode('utf-8'))
+        i = 0
+        while i < len(buf_L):
+            if len(buf_L) - i == 1 or not hasattr(self.conn, 'sendmsg'):
+                sent = self.conn.send(buf_L[i] if len(buf_L) - i == 1 else b''.join(buf_L[i:]))
+            else:
+                sent = self.conn.sendmsg(buf_L[i:i+self.iov_max]) #scatter-gather, no join copy
+            self.send_calls += 1
             if sent == 0:
                 raise RuntimeError("socket connection broken")
-            totalsent = totalsent + sent
+            while i < len(buf_L) and sent >= len(buf_L[i]):
+                sent -= len(buf_L[i])
+                i += 1
+            if sent:
+                buf_L[i] = buf_L[i][sent:]
             
             
     ## Receive data from the network and save in internal buffer
     def collect(self):
 #         print (threading.currentThread().getName() + ': Starting')
+        #read straight into one reusable buffer instead of allocating per recv
+        recv_view = memoryview(bytearray(self.recv_size))
         while(True):
+            with self.data_ready:
+                #leave anything more in the kernel until the reader makes room, so TCP's own
+                #flow control slows the sender down instead of our buffer growing without bound
+                self.data_ready.wait_for(lambda: len(self.byte_buffer) < self.buffer_limit or self.stop)
+                if self.stop:
+                    return
             try:
-                recv_bytes = self.conn.recv(2048)
-                with self.lock:
-                    self.buffer_S += recv_bytes.decode('utf-8')
+                recv_len = self.conn.recv_into(recv_view)
             # you may need to uncomment the BlockingIOError handling on Windows machines
 #             except BlockingIOError as err:
 #                 pass
-            except socket.timeout as err:
-                pass
+            except OSError as err:
+                recv_len = 0
+            with self.data_ready:
+                if not recv_len:
+                    #connection closed, either by the peer or by disconnect()
+                    self.stop = True
+                else:
+                    self.byte_buffer += recv_view[:recv_len]
+                    self.recv_calls += 1
+                    self.bytes_received += recv_len
+                self.data_ready.notify_all()
             if self.stop:
 #                 print (threading.currentThread().getName() + ': Ending')
                 return
            
-    ## Deliver collected data to client 
-    def udt_receive(self):
-        with self.lock:
-            ret_S = self.buffer_S
-            self.buffer_S = ''
-        return ret_S
+    ## Deliver collected data to client, as bytes if binary is set and as a str otherwise
+    # @param timeout: seconds to wait for data if none is buffered;
+    #  0 returns immediately, None waits until data arrives or the connection closes
+    def udt_receive(self, timeout=0):
+        if timeout != 0 and self.out_L:
+            self.flush() #the caller is about to wait, presumably for a reply to what we hold
+        with self.data_ready:
+            if timeout != 0:
+                self.data_ready.wait_for(lambda: self.byte_buffer or self.stop, timeout)
+            ret_B = bytes(self.byte_buffer)
+            del self.byte_buffer[:]
+            self.data_ready.notify_all() #the collector may be waiting for room
+        return ret_B if self.binary else self.decoder.decode(ret_B)
+
+    ## Move collected data onto the end of buffer, skipping the intermediate copy of udt_receive
+    # @param buffer: bytearray to append to
+    # @param timeout: as for udt_receive
+    # @return number of bytes appended
+    def udt_receive_into(self, buffer, timeout=0):
+        if timeout != 0 and self.out_L:
+            self.flush() #the caller is about to wait, presumably for a reply to what we hold
+        with self.data_ready:
+            if timeout != 0:
+                self.data_ready.wait_for(lambda: self.byte_buffer or self.stop, timeout)
+            recv_len = len(self.byte_buffer)
+            buffer += self.byte_buffer
+            del self.byte_buffer[:]
+            self.data_ready.notify_all() #the collector may be waiting for room
+        return recv_len
     
+
+## Accepts any number of connections on a port, each one getting its own NetworkLayer
+class NetworkListener:
+
+    ##@param backlog: connections the OS queues before accept() is called
+    def __init__(self, port, backlog=128):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('localhost', port))
+        self.sock.listen(backlog)
+
+    ## block until a client connects
+    # @return NetworkLayer for the new connection
+    def accept(self):
+        conn, addr = self.sock.accept()
+        return NetworkLayer('server', None, None, conn=conn)
+
+    def close(self):
+        self.sock.close()
+
+
+## Connects two NetworkLayers inside one process, with no socket and no collector thread.
+# Whatever one end sends is appended straight to the other end's byte_buffer, so udt_receive
+# and udt_receive_into behave exactly as they do over TCP and client and server can share a
+# process, e.g. under a profiler. A sender blocks while the other end has buffer_limit bytes
+# unread, as it would on a full socket. Ends find each other by port: the first to open a port waits
+# for the second, holding on to anything it sends in the meantime.
+class LoopbackNetworkLayer(NetworkLayer):
+    ## endpoints waiting for a peer, by port
+    waiting_D = {}
+    waiting_lock = threading.Lock()
+    peer = None
+    pending_B = None #bytes sent before the peer arrived
+
+    ##@param port: rendezvous key, None to leave the end unconnected (see pair)
+    # @param impairment: as for NetworkLayer
+    def __init__(self, role_S, server_S, port, impairment=None):
+        self.impairment = impairment if impairment is not None else self.default_impairment()
+        self.send_lock = threading.RLock()
+        self.byte_buffer = bytearray()
+        self.pending_B = bytearray()
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.lock = threading.Lock()
+        self.data_ready = threading.Condition(self.lock)
+        self.stop = False
+        if port is not None:
+            with self.waiting_lock:
+                peer = self.waiting_D.pop(port, None)
+                if peer is None:
+                    self.waiting_D[port] = self
+                else:
+                    self._connect(peer)
+
+    ## a connected pair of ends, without going through a port
+    @classmethod
+    def pair(cls, impairment_a=None, impairment_b=None):
+        a = cls('client', None, None, impairment_a)
+        b = cls('server', None, None, impairment_b)
+        a._connect(b)
+        return a, b
+
+    def _connect(self, peer):
+        for src, dst in ((self, peer), (peer, self)):
+            with src.send_lock:
+                with dst.data_ready:
+                    dst.byte_buffer += src.pending_B
+                    dst.data_ready.notify_all()
+                src.pending_B = None
+                src.peer = dst
+
+    def disconnect(self):
+        if self.timer_wheel is not None:
+            self.timer_wheel.close() #let delayed packets still in flight arrive
+        with self.waiting_lock:
+            for port, end in list(self.waiting_D.items()):
+                if end is self:
+                    del self.waiting_D[port]
+        #both ends see the connection close, as after a TCP shutdown
+        for end in (self, self.peer):
+            if end is not None:
+                with end.data_ready:
+                    end.stop = True
+                    end.data_ready.notify_all()
+
+    def __del__(self):
+        pass #no socket to close
+
+    ## append msg_S (str or bytes) to the peer's buffer
+    def _transmit(self, msg_S):
+        msg_B = msg_S.encode('utf-8') if isinstance(msg_S, str) else msg_S
+        with self.send_lock:
+            if self.stop:
+                raise RuntimeError("socket connection broken")
+            self.packets_sent += 1
+            self.bytes_sent += len(msg_B)
+            if self.peer is None:
+                self.pending_B += msg_B
+                return
+            with self.peer.data_ready:
+                self.peer.data_ready.wait_for(lambda: len(self.peer.byte_buffer) < self.peer.buffer_limit or self.peer.stop)
+                self.peer.byte_buffer += msg_B
+                self.peer.bytes_received += len(msg_B)
+                self.peer.data_ready.notify_all()
+
+
+## Runs RDT over UDP instead of TCP, so RDT alone makes delivery reliable rather than repeating
+# what TCP already does underneath it. Every packet is a datagram of its own and arrives whole
+# or not at all. A server talks to whoever sends it the first datagram, as a TCP server talks
+# to the client it accepts, and an empty datagram stands for the connection closing.
+# rdt 1.0 and 2.1 assume a channel that never loses packets. That holds only while the
+# collector keeps up, since the kernel drops datagrams once the socket buffer is full.
+class DatagramNetworkLayer(NetworkLayer):
+    batch_size = 64 #most datagrams the collector reads per wakeup
+    max_datagram = 65507 #largest packet udt_send can carry: 65535 bytes of IPv4 less the IP and UDP headers
+    rcvbuf = 4194304 #kernel receive buffer to ask for, the OS may grant less
+
+    ##@param impairment: as for NetworkLayer
+    def __init__(self, role_S, server_S, port, impairment=None):
+        conn = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if role_S == 'client':
+            logger.info('Network: role is client, over UDP')
+            conn.connect((server_S, port))
+        elif role_S == 'server':
+            logger.info('Network: role is server, over UDP')
+            conn.bind(('localhost', port))
+            #peek, so the first datagram is still there for the collector
+            data_B, addr = conn.recvfrom(self.max_datagram, socket.MSG_PEEK)
+            conn.connect(addr)
+        NetworkLayer.__init__(self, role_S, server_S, port, conn=conn, impairment=impairment)
+
+    def disconnect(self):
+        if self.timer_wheel is not None:
+            self.timer_wheel.close() #let delayed packets still in flight arrive
+        try:
+            self.flush()
+            self.conn.send(b'') #tell the peer we are gone, as closing a TCP connection would
+        except OSError:
+            pass #nobody is listening any more
+        NetworkLayer.disconnect(self)
+
+    ## @raise ValueError if msg_S does not fit in one datagram, RDT.send_stream splits payloads of any size
+    def udt_send(self, msg_S):
+        size = len(msg_S.encode('utf-8')) if isinstance(msg_S, str) else len(msg_S)
+        if size > self.max_datagram:
+            raise ValueError('Packet of %d bytes is over the %d a UDP datagram can carry' % (size, self.max_datagram))
+        NetworkLayer.udt_send(self, msg_S)
+
+    ## send every packet as a datagram of its own
+    def _write(self, buf_L):
+        for buf_B in buf_L:
+            try:
+                self.conn.send(buf_B)
+            except ConnectionRefusedError:
+                pass #the peer's port was closed when an earlier datagram arrived: this one is lost too
+            self.send_calls += 1
+
+    ## Receive datagrams and save them in the internal buffer. Python has no recvmmsg, so after
+    # blocking for one datagram the collector reads the ones already queued without blocking,
+    # and hands the batch over with one lock round trip and one wakeup of the reader.
+    def collect(self):
+        recv_view = memoryview(bytearray(self.max_datagram))
+        dontwait = getattr(socket, 'MSG_DONTWAIT', None) #not on Windows: read one at a time there
+        while(True):
+            with self.data_ready:
+                #stop reading while the reader is behind, the kernel drops what no longer fits
+                self.data_ready.wait_for(lambda: len(self.byte_buffer) < self.buffer_limit or self.stop)
+                if self.stop:
+                    return
+            batch_B = bytearray()
+            datagram_count = 0
+            closed = False
+            try:
+                recv_len = self.conn.recv_into(recv_view)
+                while True:
+                    if not recv_len:
+                        closed = True #the peer's empty datagram, or disconnect() shutting us down
+                        break
+                    batch_B += recv_view[:recv_len]
+                    datagram_count += 1
+                    if dontwait is None or datagram_count == self.batch_size:
+                        break
+                    recv_len = self.conn.recv_into(recv_view, 0, dontwait)
+            except BlockingIOError:
+                pass #read everything that was queued
+            except ConnectionRefusedError:
+                pass #a datagram we sent found no one listening, RDT will resend it
+            except OSError:
+                closed = True
+            with self.data_ready:
+                if closed:
+                    self.stop = True
+                self.byte_buffer += batch_B
+                self.recv_calls += datagram_count
+                self.bytes_received += len(batch_B)
+                self.data_ready.notify_all()
+            if self.stop:
+                return
+
+
+## NetworkLayer classes by the name RDT's transport argument uses
+transport_D = {'tcp': NetworkLayer, 'udp': DatagramNetworkLayer, 'loopback': LoopbackNetworkLayer}
  
 
 if __name__ == '__main__':
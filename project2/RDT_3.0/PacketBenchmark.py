@@ -0,0 +1,79 @@
+import argparse
+import hashlib
+import timeit
+import zlib
+from RDT import Packet, BinaryPacket
+
+
+## Packet.corrupt and Packet.from_byte_S before Packet.parse, copied as they were for the reference
+def reference_string_corrupt(byte_S):
+    length = Packet.get_length(byte_S)
+    header_S = byte_S[0 : Packet.checksummed_header_length]
+    checksum_S = bytes(byte_S[Packet.checksummed_header_length : Packet.checksummed_header_length+Packet.checksum_length])
+    msg_S = byte_S[Packet.checksummed_header_length+Packet.checksum_length : length]
+    checksum = hashlib.md5(header_S)
+    checksum.update(msg_S)
+    computed_checksum_S = checksum.hexdigest().encode('ascii')
+    return checksum_S != computed_checksum_S
+
+def reference_string_from_byte_S(byte_S):
+    if reference_string_corrupt(byte_S):
+        raise RuntimeError('Cannot initialize Packet: byte_S is corrupt')
+    seq_num = int(bytes(byte_S[Packet.length_S_length : Packet.length_S_length+Packet.seq_num_S_length]))
+    window = int(bytes(byte_S[Packet.length_S_length+Packet.seq_num_S_length : Packet.checksummed_header_length]))
+    msg_S = str(byte_S[Packet.checksummed_header_length+Packet.checksum_length : Packet.get_length(byte_S)], 'utf-8')
+    return Packet(seq_num, msg_S, window)
+
+## BinaryPacket.corrupt and BinaryPacket.from_byte_S before BinaryPacket.parse
+def reference_binary_corrupt(byte_S):
+    if len(byte_S) < BinaryPacket.header.size:
+        return True
+    length, seq_num, window, checksum = BinaryPacket.header.unpack_from(byte_S)
+    if length < BinaryPacket.header.size or length > len(byte_S):
+        return True
+    view = memoryview(byte_S)
+    computed = zlib.crc32(view[BinaryPacket.header.size : length], zlib.crc32(view[:BinaryPacket.checksummed_header_length]))
+    return checksum != computed
+
+def reference_binary_from_byte_S(byte_S):
+    if reference_binary_corrupt(byte_S):
+        raise RuntimeError('Cannot initialize Packet: byte_S is corrupt')
+    length, seq_num, window, checksum = BinaryPacket.header.unpack_from(byte_S)
+    msg_S = str(byte_S[BinaryPacket.header.size : length], 'utf-8')
+    return BinaryPacket(seq_num, msg_S, window)
+
+## the receive path before Packet.parse, kept as the reference: RDT._take_packet checked the frame
+# with corrupt(), then from_byte_S() checked it a second time before slicing the fields out
+reference_D = {Packet: (reference_string_corrupt, reference_string_from_byte_S),
+               BinaryPacket: (reference_binary_corrupt, reference_binary_from_byte_S)}
+
+def reference_receive(packet_class, frame):
+    corrupt, from_byte_S = reference_D[packet_class]
+    return None if corrupt(frame) else from_byte_S(frame)
+
+## time encode and receive of one packet of each format
+# @return {format name: (encode us, reference receive us, parse us, header bytes)}
+def measure(msg_S, number):
+    result_D = {}
+    for name, packet_class in (('string', Packet), ('binary', BinaryPacket)):
+        p = packet_class(12345, msg_S)
+        byte_S = p.get_byte_S()
+        frame = memoryview(byte_S) #as RDT._take_packet hands parse a frame of its receive buffer
+        assert packet_class.parse(frame).msg_S == reference_receive(packet_class, frame).msg_S == msg_S
+        encode = timeit.timeit(p.get_byte_S, number=number)
+        receive = timeit.timeit(lambda: reference_receive(packet_class, frame), number=number)
+        parse = timeit.timeit(lambda: packet_class.parse(frame), number=number)
+        result_D[name] = (encode/number*1e6, receive/number*1e6, parse/number*1e6, len(byte_S) - len(msg_S.encode('utf-8')))
+    return result_D
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Compare the string/MD5 and binary/CRC32 packet formats.')
+    parser.add_argument('--number', help='Iterations per measurement.', type=int, default=20000)
+    parser.add_argument('--sizes', help='Payload sizes in characters.', type=int, nargs='+', default=[3, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    print('%6s  %-6s  %6s  %10s  %10s  %10s  %7s' % ('size', 'format', 'header', 'encode us', 'old rcv us', 'parse us', 'speedup'))
+    for size in args.sizes:
+        for name, (encode, receive, parse, header) in measure('x'*size, args.number).items():
+            print('%6d  %-6s  %6d  %10.2f  %10.2f  %10.2f  %6.1fx' % (size, name, header, encode, receive, parse, receive / parse))
@@ -0,0 +1,77 @@
+import argparse
+import random
+import time
+import Server
+
+
+## the original makePigLatin and piglatinize, kept as the reference output
+def reference_makePigLatin(word):
+    m  = len(word)
+    vowels = "a", "e", "i", "o", "u", "y"
+    if m<3 or word=="the":
+        return word
+    else:
+        for i in vowels:
+            if word.find(i) < m and word.find(i) != -1:
+                m = word.find(i)
+        if m==0:
+            return word+"way"
+        else:
+            return word[m:]+word[:m]+"ay"
+
+def reference_piglatinize(message):
+    essagemay = ""
+    message = message.strip(".")
+    for word in message.split(' '):
+        essagemay += " "+reference_makePigLatin(word)
+    return essagemay.strip()+"."
+
+## random quotation-like messages, with the punctuation, capitals, digits and odd spacing
+# that exercise the edge cases of the conversion
+# @param size: approximate corpus size in characters
+def make_corpus(size, seed):
+    rng = random.Random(seed)
+    vocabulary_L = ['the', 'a', 'of', 'to', 'is', 'and', 'mathematician', 'device', 'coffee', 'theorems', 'Grove', 'giveth',
+                    'Gates', 'taketh', 'away.', 'Wise', 'men', 'make', 'proverbs,', 'fools', 'repeat', 'them.', 'rhythm', 'myth',
+                    'C++', '--', '(1805-80)', 'Ethernet)', 'yes', 'eye', 'strength', 'queue', 'xyz', '', 'ünïcödé', 'NAÏVE']
+    vocabulary_L += [''.join(rng.choice('abcdefghijklmnopqrstuvwxyzAEIOU') for i in range(rng.randint(1, 12))) for j in range(5000)]
+    msg_L = []
+    total = 0
+    while total < size:
+        msg_S = ' '.join(rng.choice(vocabulary_L) for i in range(rng.randint(1, 40)))
+        msg_S = rng.choice(['', '.', '..']) + msg_S + rng.choice(['', '.', '...', ' '])
+        msg_L.append(msg_S)
+        total += len(msg_S)
+    return msg_L
+
+## run convert once over msg_L
+# @return (seconds, output joined into one string)
+def measure(convert, msg_L):
+    start = time.time()
+    out_L = convert(msg_L)
+    return time.time() - start, '\n'.join(out_L)
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Compare the original and the cached piglatinize on a large corpus.')
+    parser.add_argument('--size', help='Corpus size in characters.', type=int, default=5000000)
+    parser.add_argument('--seed', help='Corpus random seed.', type=int, default=466)
+    parser.add_argument('--file', help='Use the lines of this file as the corpus instead.', default=None)
+    args = parser.parse_args()
+
+    if args.file is not None:
+        with open(args.file) as corpus_file:
+            msg_L = [line.rstrip('\n') for line in corpus_file]
+    else:
+        msg_L = make_corpus(args.size, args.seed)
+    print('%d messages, %.1f MB' % (len(msg_L), sum(len(msg_S) for msg_S in msg_L) / 1e6))
+
+    reference_time, reference_S = measure(lambda msg_L: [reference_piglatinize(msg_S) for msg_S in msg_L], msg_L)
+    print('%-22s  %7.2f s' % ('original piglatinize', reference_time))
+    Server.makePigLatin.cache_clear()
+    for name, convert in (('piglatinize, cold', lambda msg_L: [Server.piglatinize(msg_S) for msg_S in msg_L]),
+                          ('piglatinize, warm', lambda msg_L: [Server.piglatinize(msg_S) for msg_S in msg_L]),
+                          ('piglatinize_many', Server.piglatinize_many)):
+        elapsed, out_S = measure(convert, msg_L)
+        identical = out_S.encode('utf-8') == reference_S.encode('utf-8')
+        print('%-22s  %7.2f s  %5.1fx  %s' % (name, elapsed, reference_time / elapsed, 'identical' if identical else 'OUTPUT DIFFERS'))
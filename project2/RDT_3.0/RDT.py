@@ -1,282 +1,1059 @@
+import Impairment
 import Network
 import argparse
 from time import sleep
 import time
+import bisect
 import hashlib
+import logging
+import struct
+import threading
+import zlib
+
+## protocol events at DEBUG level; silent unless the application configures logging
+logger = logging.getLogger('RDT')
+
+## Messages are str, carried as UTF-8, or bytes, sent as they are. Received messages are always str:
+# the surrogateescape error handler maps any byte that is not valid UTF-8 to a lone surrogate and
+# back, so bytes survive the trip one for one, see RDT.send_stream.
 class Packet:
    ## the number of bytes used to store packet length
    seq_num_S_length = 10
    length_S_length = 10
+   ## the number of bytes used to store the advertised receive window
+   window_S_length = 10
+   ## the header fields the checksum covers: length, sequence number and window
+   checksummed_header_length = length_S_length + seq_num_S_length + window_S_length
    ## length of md5 checksum in hex
    checksum_length = 32
+   ## window advertised by a sender that puts no limit on what it receives
+   no_window = 2**32 - 1
         
-   def __init__(self, seq_num, msg_S):
+   ##@param window: further data packets the sender of this packet can take, see RDT.rcv_window
+   def __init__(self, seq_num, msg_S, window=None):
       self.seq_num = seq_num
       self.msg_S = msg_S
+      self.window = self.no_window if window is None else window
         
+   ## @param byte_S: bytes-like (bytes, bytearray or memoryview) holding the packet
    @classmethod
    def from_byte_S(self, byte_S):
-      if Packet.corrupt(byte_S):
+      p = self.parse(byte_S)
+      if p is None:
          raise RuntimeError('Cannot initialize Packet: byte_S is corrupt')
-      #extract the fields
-      seq_num = int(byte_S[Packet.length_S_length : Packet.length_S_length+Packet.seq_num_S_length])
-      msg_S = byte_S[Packet.length_S_length+Packet.seq_num_S_length+Packet.checksum_length :]
-      return self(seq_num, msg_S)
+      return p
+
+   ## verify and parse the packet at the front of byte_S in one pass: the checksum is computed
+   # over views of the frame, and only the fields of an intact packet are copied out
+   # @param byte_S: bytes-like, on the receive path a memoryview of exactly one frame
+   # @return the Packet, or None if it is corrupt
+   @classmethod
+   def parse(cls, byte_S):
+      msg_start = Packet.checksummed_header_length + Packet.checksum_length
+      header_S = bytes(byte_S[:msg_start]) #the only copy besides the message itself
+      try:
+         length = int(header_S[:Packet.length_S_length])
+      except ValueError:
+         return None
+      if length < msg_start or length > len(byte_S):
+         return None
+      msg_view = memoryview(byte_S)[msg_start:length]
+      checksum = hashlib.md5(header_S[:Packet.checksummed_header_length])
+      checksum.update(msg_view)
+      if checksum.hexdigest().encode('ascii') != header_S[Packet.checksummed_header_length:]:
+         return None
+      seq_num = int(header_S[Packet.length_S_length : Packet.length_S_length+Packet.seq_num_S_length])
+      window = int(header_S[Packet.length_S_length+Packet.seq_num_S_length : Packet.checksummed_header_length])
+      return cls(seq_num, str(msg_view, 'utf-8', 'surrogateescape'), window)
         
         
    def get_byte_S(self):
       #convert sequence number of a byte field of seq_num_S_length bytes
       seq_num_S = str(self.seq_num).zfill(self.seq_num_S_length)
-      #convert length to a byte field of length_S_length bytes
-      length_S = str(self.length_S_length + len(seq_num_S) + self.checksum_length + len(self.msg_S)).zfill(self.length_S_length)
+      window_S = str(self.window).zfill(self.window_S_length)
+      #convert length to a byte field of length_S_length bytes, counting the message in UTF-8 bytes
+      msg_B = self.msg_S if isinstance(self.msg_S, bytes) else self.msg_S.encode('utf-8', 'surrogateescape')
+      length_S = str(self.checksummed_header_length + self.checksum_length + len(msg_B)).zfill(self.length_S_length)
       #compute the checksum
-      checksum = hashlib.md5((length_S+seq_num_S+self.msg_S).encode('utf-8'))
+      checksum = hashlib.md5((length_S+seq_num_S+window_S).encode('utf-8') + msg_B)
       checksum_S = checksum.hexdigest()
-      #compile into a string
-      return length_S + seq_num_S + checksum_S + self.msg_S
+      #compile into the bytes the network sends, so their length is what goes on the wire
+      return (length_S + seq_num_S + window_S + checksum_S).encode('ascii') + msg_B
    
     
+   ## read the packet length from the header at the front of byte_S
    @staticmethod
-   def corrupt(byte_S):
-      #extract the fields
-      length_S = byte_S[0:Packet.length_S_length]
-      seq_num_S = byte_S[Packet.length_S_length : Packet.seq_num_S_length+Packet.seq_num_S_length]
-      checksum_S = byte_S[Packet.seq_num_S_length+Packet.seq_num_S_length : Packet.seq_num_S_length+Packet.length_S_length+Packet.checksum_length]
-      msg_S = byte_S[Packet.seq_num_S_length+Packet.seq_num_S_length+Packet.checksum_length :]
-        
-      #compute the checksum locally
-      checksum = hashlib.md5(str(length_S+seq_num_S+msg_S).encode('utf-8'))
-      computed_checksum_S = checksum.hexdigest()
-      #and check if the same
-      return checksum_S != computed_checksum_S
-        
+   def get_length(byte_S):
+      return int(bytes(byte_S[:Packet.length_S_length]))
+
+   ## split every complete packet off the front of a buffer in one linear pass
+   # @return (list of Packets with None in place of corrupt ones, leftover bytes)
+   @classmethod
+   def split_byte_S(cls, byte_S):
+      pkt_L = []
+      start = 0
+      while len(byte_S) - start >= cls.length_S_length:
+         length = cls.get_length(byte_S[start : start+cls.length_S_length])
+         if len(byte_S) - start < length:
+            break #not enough bytes to read the whole packet
+         with memoryview(byte_S)[start : start+length] as frame:
+            pkt_L.append(cls.parse(frame))
+         start += length
+      return pkt_L, byte_S[start:]
+
+   ## checks the single packet at the front of byte_S, ignoring anything after it
+   @classmethod
+   def corrupt(cls, byte_S):
+      return cls.parse(byte_S) is None
+
+
+## Compact alternative to Packet with the same interface.
+# The header is struct-packed (length, seq_num, window, CRC32), 16 bytes instead of 62,
+# and the message travels as UTF-8 bytes; msg_S is still a str to callers.
+class BinaryPacket(Packet):
+   ## length, sequence number, window and checksum as unsigned 32-bit big-endian ints
+   header = struct.Struct('!IIII')
+   ## the number of bytes needed to read the packet length
+   length_S_length = 4
+   ## the bytes covered by the checksum before the payload
+   checksummed_header_length = 12
+
+   @classmethod
+   def parse(cls, byte_S):
+      if len(byte_S) < BinaryPacket.header.size:
+         return None
+      length, seq_num, window, checksum = BinaryPacket.header.unpack_from(byte_S)
+      if length < BinaryPacket.header.size or length > len(byte_S):
+         return None
+      view = memoryview(byte_S)
+      msg_view = view[BinaryPacket.header.size : length]
+      if zlib.crc32(msg_view, zlib.crc32(view[:BinaryPacket.checksummed_header_length])) != checksum:
+         return None
+      return cls(seq_num, str(msg_view, 'utf-8', 'surrogateescape'), window)
+
+   def get_byte_S(self):
+      msg_B = self.msg_S if isinstance(self.msg_S, bytes) else self.msg_S.encode('utf-8', 'surrogateescape')
+      prefix_B = struct.pack('!III', self.header.size + len(msg_B), self.seq_num, self.window)
+      checksum = zlib.crc32(msg_B, zlib.crc32(prefix_B))
+      return prefix_B + struct.pack('!I', checksum) + msg_B
+
+   @staticmethod
+   def get_length(byte_S):
+      return int.from_bytes(bytes(byte_S[:BinaryPacket.length_S_length]), 'big')
+
+## packet_format argument of RDT -> packet class
+packet_format_D = {'string': Packet, 'binary': BinaryPacket}
+
+
+## Adaptive retransmission timeout, after Jacobson/Karels and RFC 6298.
+# Feed it RTT samples only for packets that were transmitted once (Karn's
+# rule) and call backoff() on every timeout.
+class RTTEstimator:
+   ## gains for the smoothed RTT and RTT variation
+   alpha = 0.125
+   beta = 0.25
+   ## RTO = SRTT + k*RTTVAR
+   k = 4
+   ## lower bound on the timeout in seconds
+   min_rto = 0.1
+
+   ##@param initial_rto: timeout to use before the first sample
+   # @param max_rto: upper bound on the timeout, backoff included
+   def __init__(self, initial_rto, max_rto=60):
+      self.srtt = None
+      self.rttvar = None
+      self.rto = initial_rto
+      self.max_rto = max_rto
+      self.sample_count = 0
+      self.backoff_count = 0
+      self.last_sample = None
+
+   ## update the estimate with a measured round trip time in seconds
+   def sample(self, rtt):
+      if self.srtt is None:
+         self.srtt = rtt
+         self.rttvar = rtt / 2
+      else:
+         self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+         self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+      #a fresh sample also undoes any backoff
+      self.rto = min(self.max_rto, max(self.min_rto, self.srtt + self.k * self.rttvar))
+      self.sample_count += 1
+      self.last_sample = rtt
+
+   ## double the timeout after a retransmission timer fires
+   def backoff(self):
+      self.rto = min(self.max_rto, self.rto * 2)
+      self.backoff_count += 1
+
+   ## @return dictionary of the current estimate, times in seconds
+   def get_stats(self):
+      return {'srtt': self.srtt, 'rttvar': self.rttvar, 'rto': self.rto, 'last_sample': self.last_sample,
+              'samples': self.sample_count, 'backoffs': self.backoff_count}
+
+
+## Counters for one RDT connection, see RDT.get_stats
+class RDTStats:
+   ## upper bounds in seconds of the RTT histogram buckets, a last bucket holds anything slower
+   rtt_bucket_L = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+
+   def __init__(self):
+      self.packets_sent = 0
+      self.packets_received = 0
+      self.bytes_sent = 0
+      self.bytes_received = 0
+      self.retransmits = 0
+      self.timeouts = 0
+      self.corrupt = 0 #packets dropped for failing their checksum
+      self.duplicates = 0 #data packets received again
+      self.duplicate_acks = 0 #ACKs for packets already acknowledged
+      self.naks_sent = 0
+      self.naks_received = 0
+      self.overruns = 0 #data packets dropped because the receive window was full
+      self.rtt_histogram_L = [0] * (len(self.rtt_bucket_L) + 1)
+
+   def add_rtt(self, rtt):
+      self.rtt_histogram_L[bisect.bisect_left(self.rtt_bucket_L, rtt)] += 1
+
+   ## @return dictionary of the counters, with the RTT histogram as {bucket upper bound: samples}
+   def get_stats(self):
+      stats_D = {name: value for name, value in vars(self).items() if name != 'rtt_histogram_L'}
+      stats_D['rtt_histogram'] = dict(zip(self.rtt_bucket_L + [float('inf')], self.rtt_histogram_L))
+      return stats_D
+
+
+## Reno congestion control for the GBN and SR senders (RFC 5681), counting in packets: slow start,
+# congestion avoidance, and fast retransmit with fast recovery on the third duplicate ACK.
+# Like RTTEstimator, each connection has its own.
+class RenoCongestion:
+   ## duplicate ACKs that signal a lost packet
+   dup_threshold = 3
+
+   ##@param initial_window: congestion window to start with, in packets
+   def __init__(self, initial_window=2):
+      self.cwnd = initial_window
+      self.ssthresh = Packet.no_window
+      self.dup_acks = 0
+      self.in_recovery = False
+      self.fast_retransmits = 0
+
+   ## @return packets past send_base that may be in flight
+   def window(self):
+      return max(1, int(self.cwnd))
+
+   ## packets were newly acknowledged
+   # @param advanced: send_base moved, so the hole duplicate ACKs pointed at is filled
+   def ack(self, acked, advanced):
+      if self.in_recovery:
+         if advanced:
+            #the retransmission got through: deflate and carry on avoiding congestion
+            self.cwnd = self.ssthresh
+            self.in_recovery = False
+            self.dup_acks = 0
+         return
+      if advanced:
+         self.dup_acks = 0
+      if self.cwnd < self.ssthresh:
+         self.cwnd += acked #slow start: double every round trip
+      else:
+         self.cwnd += acked / self.cwnd #congestion avoidance: one packet more every round trip
+
+   ## an ACK said send_base is still missing
+   # @param flight: packets past send_base sent so far
+   # @return True if send_base should be fast retransmitted now
+   def duplicate(self, flight):
+      if self.in_recovery:
+         self.cwnd += 1 #each duplicate means a packet has left the network
+         return False
+      self.dup_acks += 1
+      if self.dup_acks < self.dup_threshold:
+         return False
+      self.ssthresh = max(flight // 2, 2)
+      self.cwnd = self.ssthresh + self.dup_threshold
+      self.in_recovery = True
+      self.fast_retransmits += 1
+      return True
+
+   ## the retransmission timer ran out: start again from one packet
+   def timeout(self, flight):
+      self.ssthresh = max(flight // 2, 2)
+      self.cwnd = 1
+      self.dup_acks = 0
+      self.in_recovery = False
+
+   ## @return dictionary of the controller's state
+   def get_stats(self):
+      return {'cwnd': self.cwnd, 'ssthresh': self.ssthresh, 'fast_retransmits': self.fast_retransmits}
+
+
+## No congestion control: only window_size and the receive window limit the sender.
+class NoCongestion:
+   def window(self):
+      return Packet.no_window
+
+   def ack(self, acked, advanced):
+      pass
+
+   def duplicate(self, flight):
+      return False
+
+   def timeout(self, flight):
+      pass
+
+   def get_stats(self):
+      return {}
+
+## congestion argument of RDT -> congestion controller class
+congestion_D = {'reno': RenoCongestion, 'none': NoCongestion}
+
+
+## Timeout strategy of rdt 2.1: the channel corrupts packets but never loses them,
+# so the sender waits for a reply however long it takes
+class NoTimeout:
+   ## with no timer, the peer repeating its data is the only sign our packet never arrived
+   resend_on_duplicate = True
+
+   ## @return seconds to wait for an ACK before retransmitting, None for no limit
+   def rto(self, rdt):
+      return None
+
+   ## the retransmission timer ran out
+   def expired(self, rdt):
+      pass
+
+
+## Timeout strategy of rdt 3.0, GBN and SR: the adaptive timeout of the connection's
+# RTTEstimator, backed off every time it runs out
+class AdaptiveTimeout:
+   resend_on_duplicate = False
+
+   def rto(self, rdt):
+      return rdt.rtt.rto
+
+   def expired(self, rdt):
+      rdt.rtt.backoff()
+
+
+## Recovery strategy of rdt 2.1 and 3.0: NAK a corrupt packet, and resend on a NAK, so a
+# corrupted packet is repeated without waiting for a timeout
+class NakRecovery:
+   resend_on_nak = True
+
+   ## a packet failed its checksum while we were waiting for seq_num
+   def corrupt(self, rdt, seq_num):
+      rdt._event('corrupt', seq_num, "data corrupted, sent NAK")
+      rdt._send_packet(rdt._packet(seq_num, "NAK"))
+
+
+## Recovery strategy of GBN and SR: drop a corrupt packet and let the sender's timer recover it
+class TimerRecovery:
+   resend_on_nak = False
+
+   def corrupt(self, rdt, seq_num):
+      rdt._event('corrupt', seq_num, "data corrupted, dropped")
+
+
+## Window strategy of Go-Back-N: cumulative ACKs, a receiver that only takes packets in order,
+# and one timer, for the oldest packet, that resends the whole window
+class GoBackN:
+   ## True if every packet has its own retransmission timer
+   per_packet_timers = False
+
+   ## slide the sending window past an ACK for seq_num, already checked to be in the window
+   def ack(self, rdt, seq_num):
+      for s in range(rdt.send_base, seq_num+1):
+         rdt.unacked_D.pop(s, None)
+         rdt.timer_D.pop(s, None)
+         rdt.retransmitted_S.discard(s)
+         rdt.lost_S.discard(s)
+      rdt.send_base = seq_num + 1
+
+   ## @return True if an ACK for seq_num says send_base is missing
+   def duplicate_ack(self, rdt, seq_num):
+      #the receiver repeats its cumulative ACK for every packet after a hole
+      return seq_num == rdt.send_base - 1 and rdt.send_base < rdt.next_seq_num
+
+   ## @return seq_nums to resend once duplicate ACKs report send_base missing
+   def fast_retransmit(self, rdt):
+      #the receiver threw away everything after the hole
+      return list(range(rdt.send_base, rdt.next_seq_num))
+
+   ## handle data packet p on the receiving side of the window
+   def data(self, rdt, p):
+      if p.seq_num == rdt.rcv_base and not rdt._rcv_space():
+         #no room: drop it unacknowledged, the sender's timer tries again
+         rdt.stats.overruns += 1
+         rdt._event('overrun', p.seq_num, "receive window full, dropped packet %d", p.seq_num)
+      elif p.seq_num == rdt.rcv_base:
+         rdt.deliver_L.append(p.msg_S)
+         rdt.rcv_base += 1
+         #cumulative ACK for everything received in order so far, possibly batched
+         rdt._delay_ack(rdt.rcv_base-1)
+      elif rdt.rcv_base > 1:
+         #out of order or duplicate: repeat the cumulative ACK straight away
+         if p.seq_num < rdt.rcv_base:
+            rdt.stats.duplicates += 1
+         rdt._event('out_of_order', p.seq_num, "out of order packet %d, resend ACK %d", p.seq_num, rdt.rcv_base-1)
+         rdt._delay_ack(rdt.rcv_base-1)
+         rdt._flush_ack()
+
+   ## @return seq_nums to retransmit at time now with timeout rto
+   def expired(self, rdt, now, rto):
+      if rdt.send_base in rdt.timer_D and now - rdt.timer_D[rdt.send_base] > rto:
+         #go back N: resend every unacknowledged packet in the window
+         return list(range(rdt.send_base, rdt.next_seq_num))
+      return []
+
+
+## Window strategy of Selective Repeat: individual ACKs, a receiver that buffers packets
+# out of order, and a timer per packet
+class SelectiveRepeat:
+   per_packet_timers = True
+
+   def ack(self, rdt, seq_num):
+      rdt.unacked_D.pop(seq_num, None)
+      rdt.timer_D.pop(seq_num, None)
+      rdt.retransmitted_S.discard(seq_num)
+      rdt.lost_S.discard(seq_num)
+      while rdt.send_base < rdt.next_seq_num and rdt.send_base not in rdt.unacked_D:
+         rdt.send_base += 1
+
+   def data(self, rdt, p):
+      if rdt.rcv_base + min(rdt.window_size, rdt._rcv_space()) <= p.seq_num < rdt.rcv_base + rdt.window_size:
+         #no room: drop it unacknowledged, the sender's timer tries again
+         rdt.stats.overruns += 1
+         rdt._event('overrun', p.seq_num, "receive window full, dropped packet %d", p.seq_num)
+      elif rdt.rcv_base <= p.seq_num < rdt.rcv_base + rdt.window_size:
+         rdt._send_packet(rdt._packet(p.seq_num, "ACK"))
+         rdt.rcv_buffer_D[p.seq_num] = p.msg_S
+         #hand up the in-order run starting at rcv_base
+         while rdt.rcv_base in rdt.rcv_buffer_D:
+            rdt.deliver_L.append(rdt.rcv_buffer_D.pop(rdt.rcv_base))
+            rdt.rcv_base += 1
+      elif rdt.rcv_base - rdt.window_size <= p.seq_num < rdt.rcv_base:
+         #already delivered, our ACK must have been lost
+         rdt.stats.duplicates += 1
+         rdt._event('duplicate', p.seq_num, "duplicate packet %d, resend ACK", p.seq_num)
+         rdt._send_packet(rdt._packet(p.seq_num, "ACK"))
+
+   def expired(self, rdt, now, rto):
+      return [s for s, t in rdt.timer_D.items() if now - t > rto]
+
+   def duplicate_ack(self, rdt, seq_num):
+      #ACKs keep coming for packets sent after send_base, but not for send_base
+      return rdt.send_base < seq_num < rdt.next_seq_num and rdt.send_base in rdt.unacked_D
+
+   def fast_retransmit(self, rdt):
+      return [rdt.send_base]
+
+
+## One protocol version, as the strategies the RDT engine runs it with. The strategies keep
+# no state of their own - that lives in the RDT - so every connection can share them.
+class Protocol:
+   ##@param timeout: NoTimeout or AdaptiveTimeout
+   # @param recovery: NakRecovery or TimerRecovery, None for a protocol without acknowledgements
+   # @param window: None for stop-and-wait, GoBackN or SelectiveRepeat to pipeline
+   def __init__(self, name_S, timeout=None, recovery=None, window=None):
+      self.name_S = name_S
+      self.timeout = timeout
+      self.recovery = recovery
+      self.window = window
+
+## every protocol version RDT.send and RDT.receive speak, by name
+protocol_D = {'1.0': Protocol('1.0'),
+              '2.1': Protocol('2.1', NoTimeout(), NakRecovery()),
+              '3.0': Protocol('3.0', AdaptiveTimeout(), NakRecovery()),
+              'gbn': Protocol('gbn', AdaptiveTimeout(), TimerRecovery(), GoBackN()),
+              'sr': Protocol('sr', AdaptiveTimeout(), TimerRecovery(), SelectiveRepeat())}
+
+
 class RDT:
    ## latest sequence number used in a packet
    seq_num = 1
-   ## buffer of bytes read from network
-   byte_buffer = '' 
-   def __init__(self, role_S, server_S, port):
-      self.network = Network.NetworkLayer(role_S, server_S, port)
+   ## buffer of bytes read from network, parsed in place starting at buffer_start
+   byte_buffer = None
+   buffer_start = 0
+   ## seconds to wait for an ACK before retransmitting until the RTT estimator has a sample,
+   # and the most it will ever back off to
+   time_allowed = 3
+   ## payload bytes of one send_stream segment, which are also the bytes it puts on the wire
+   mss = 1024
+   ## first character of every send_stream message: a data segment, or the end of the stream
+   stream_data_S = 'D'
+   stream_end_S = 'E'
+   stream_data_B = b'D' #stream_data_S in front of the segment bytes send_stream sends
+   ## Impairment.TimerWheel that flushes the delayed ACKs of every connection, started on first use
+   ack_wheel = None
+   ack_wheel_lock = threading.Lock()
+   ack_wheel_tick = 0.01 #resolution of ack_wheel: an ACK owed by an idle application is late by up to this much
+   ##@param network: use an existing NetworkLayer, e.g. from NetworkListener.accept(), instead of opening one
+   # @param packet_format: 'string' for the ASCII/MD5 Packet, 'binary' for the struct/CRC32 BinaryPacket;
+   #  both ends of the connection must use the same format
+   # @param ack_every, ack_delay: delayed ACK policy for rdt_3_0 and GBN receivers - acknowledge once
+   #  ack_every packets are waiting or ack_delay seconds have passed, whichever is first, unless data
+   #  we send acknowledges them first; ack_delay=0 acknowledges every packet at once
+   # @param impairment: Impairment.ImpairmentPipeline for the NetworkLayer we open, see NetworkLayer
+   # @param transport: 'tcp' for a socket, 'udp' for a DatagramNetworkLayer, 'loopback' for an
+   #  in-process LoopbackNetworkLayer that pairs with the other end opened on the same port
+   # @param trace: called as trace(event_S, seq_num, time) for every protocol event, e.g. to record a run
+   # @param protocol: key of protocol_D that send, receive and flush speak
+   # @param rcv_window: most messages the GBN and SR receivers hold for the application; every
+   #  packet advertises the room left, and the sender keeps no more than that in flight
+   # @param congestion: key of congestion_D, the congestion control of the GBN and SR senders
+   def __init__(self, role_S, server_S, port, window_size=8, network=None, packet_format='string', ack_every=2, ack_delay=0, impairment=None, transport='tcp', trace=None, protocol='3.0', rcv_window=64, congestion='reno'):
+      if network is None:
+         network = Network.transport_D[transport](role_S, server_S, port, impairment=impairment)
+      self.network = network
+      self.protocol = protocol_D[protocol]
+      self.stats = RDTStats()
+      self.trace = trace
+      self.packet_class = packet_format_D[packet_format]
+      self.byte_buffer = bytearray()
+      ## retransmission timeout, shared by every sending mode
+      self.rtt = RTTEstimator(self.time_allowed, self.time_allowed)
+      ## sliding window state for the GBN and SR senders
+      self.window_size = window_size
+      self.send_base = 1
+      self.next_seq_num = 1
+      self.unacked_D = {} #seq_num -> Packet not yet acknowledged
+      self.timer_D = {} #seq_num -> time the packet was last sent
+      self.retransmitted_S = set() #seq_nums sent more than once, not used for RTT samples
+      self.lost_S = set() #seq_nums timed out or fast retransmitted, resent as the window allows
+      self.congestion = congestion_D[congestion]()
+      #room the peer last advertised, counted from send_base; until it first says, assume it has as much as we do
+      self.peer_window = rcv_window
+      ## sliding window state for the GBN and SR receivers
+      self.rcv_base = 1
+      self.rcv_buffer_D = {} #seq_num -> msg_S received out of order (SR only)
+      self.deliver_L = [] #messages received in order but not yet handed up
+      self.rcv_window = rcv_window
+      self.advertised_window = Packet.no_window #window carried by the last packet we sent
+      self.delivering = False #True while pumping for receive, which hands up all of deliver_L
+      ## delayed ACK state
+      self.ack_every = ack_every
+      self.ack_delay = ack_delay
+      self.pending_ack = None #seq_num to acknowledge, None if nothing is owed
+      self.pending_ack_count = 0
+      self.ack_deadline = None #time.monotonic() at which the pending ACK falls due
+      self.ack_lock = threading.RLock() #ack_wheel flushes ACKs from its own thread
     
    def disconnect(self):
+      self._send_owed_ack()
       self.network.disconnect()
+
+   ## flush the pending ACK from ack_wheel or disconnect, where nobody is left to handle errors
+   # @param due_only: as for _flush_ack
+   def _send_owed_ack(self, due_only=False):
+      try:
+         self._flush_ack(due_only)
+      except (OSError, RuntimeError):
+         pass #peer is already gone
+
+   ## @return the shared ack_wheel, starting it if this is the first delayed ACK
+   @classmethod
+   def _ack_wheel(cls):
+      with cls.ack_wheel_lock:
+         if cls.ack_wheel is None:
+            cls.ack_wheel = Impairment.TimerWheel(cls.ack_wheel_tick)
+         return cls.ack_wheel
+
+   ## @return dictionary of this connection's counters, its RTT estimate, its congestion control state
+   # and its network layer's counters
+   def get_stats(self):
+      stats_D = self.stats.get_stats()
+      stats_D['rtt'] = self.rtt.get_stats()
+      stats_D['congestion'] = self.congestion.get_stats()
+      stats_D['network'] = self.network.get_stats()
+      return stats_D
+
+   ## log a protocol event and pass it to the trace hook
+   # @param log_S, arg_L: logger.debug message and arguments, only formatted if DEBUG is enabled
+   def _event(self, event_S, seq_num, log_S, *arg_L):
+      logger.debug(log_S, *arg_L)
+      if self.trace is not None:
+         self.trace(event_S, seq_num, time.time())
+
+   ## @return packet for seq_num and msg_S, advertising our receive window
+   def _packet(self, seq_num, msg_S):
+      self.advertised_window = self._rcv_space()
+      return self.packet_class(seq_num, msg_S, self.advertised_window)
+
+   ## @return messages past rcv_base the receive window still has room for
+   def _rcv_space(self):
+      if self.delivering:
+         return self.rcv_window #everything goes up as soon as the pump is done
+      return max(0, self.rcv_window - len(self.deliver_L))
+
+   ## the application took messages off deliver_L: if the peer was told the window was
+   # (nearly) closed, tell it how much room there is now, as it may be waiting for that
+   def _window_update(self):
+      if self.rcv_base > 1 and self.advertised_window * 2 < self.rcv_window:
+         self._clear_ack() #it acknowledges the same as a pending ACK would
+         self._send_packet(self._packet(self.rcv_base - 1, "ACK"))
+
+   ## hand packet p to the network, counting it
+   def _send_packet(self, p):
+      byte_S = p.get_byte_S()
+      self.stats.packets_sent += 1
+      self.stats.bytes_sent += len(byte_S)
+      if p.msg_S == "NAK":
+         self.stats.naks_sent += 1
+      if self.trace is not None:
+         self.trace('send_ack' if p.msg_S == "ACK" else 'send_nak' if p.msg_S == "NAK" else 'send_data', p.seq_num, time.time())
+      self.network.udt_send(byte_S)
+
+   ## feed a measured round trip time to the estimator and the histogram
+   def _rtt_sample(self, rtt):
+      self.rtt.sample(rtt)
+      self.stats.add_rtt(rtt)
+
+   ## acknowledge seq_num, straight away or batched according to ack_every and ack_delay
+   def _delay_ack(self, seq_num):
+      with self.ack_lock:
+         self.pending_ack = seq_num
+         self.pending_ack_count += 1
+         if self.ack_delay <= 0 or self.pending_ack_count >= self.ack_every:
+            self._flush_ack()
+         elif self.ack_deadline is None:
+            self.ack_deadline = time.monotonic() + self.ack_delay
+            #an idle application still owes the ACK, the peer would retransmit forever otherwise;
+            #if the ACK has gone out by then, or a later one is pending, this does nothing
+            self._ack_wheel().schedule(self.ack_deadline, lambda: self._send_owed_ack(due_only=True))
+
+   ## send the pending ACK, if any
+   # @param due_only: only send it once ack_delay has run out
+   def _flush_ack(self, due_only=False):
+      with self.ack_lock:
+         if self.pending_ack is None or (due_only and time.monotonic() < self.ack_deadline):
+            return
+         self._send_packet(self._packet(self.pending_ack, "ACK"))
+         self._clear_ack()
+
+   ## forget the pending ACK, e.g. because the data we are about to send acknowledges it
+   def _clear_ack(self):
+      with self.ack_lock:
+         self.pending_ack = None
+         self.pending_ack_count = 0
+         self.ack_deadline = None
+
+   ## cap a receive timeout so we wake up when the pending ACK falls due
+   def _ack_wait(self, timeout):
+      deadline = self.ack_deadline #ack_wheel may clear it under us
+      if deadline is None:
+         return timeout
+      due = max(0, deadline - time.monotonic())
+      return due if timeout is None else min(due, timeout)
+
+   ## append newly collected bytes to byte_buffer
+   # @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   def _fill(self, timeout=0):
+      #drop the bytes already parsed once they are at least half the buffer,
+      #so each byte is moved at most once on average
+      if self.buffer_start and self.buffer_start*2 >= len(self.byte_buffer):
+         del self.byte_buffer[:self.buffer_start]
+         self.buffer_start = 0
+      self.network.udt_receive_into(self.byte_buffer, timeout)
+
+   ## @return length of the packet at buffer_start, or None if it has not fully arrived
+   def _frame_length(self):
+      available = len(self.byte_buffer) - self.buffer_start
+      if available < self.packet_class.length_S_length:
+         return None #not enough bytes to read packet length
+      length = self.packet_class.get_length(self.byte_buffer[self.buffer_start : self.buffer_start+self.packet_class.length_S_length])
+      return length if available >= length else None
+
+   ## parse the packet at buffer_start in place and step past it
+   # @return the Packet, or None if it is corrupt
+   def _take_packet(self, length):
+      with memoryview(self.byte_buffer)[self.buffer_start : self.buffer_start+length] as frame:
+         p = self.packet_class.parse(frame)
+      self.buffer_start += length
+      self.stats.packets_received += 1
+      self.stats.bytes_received += length
+      if p is None:
+         self.stats.corrupt += 1
+      return p
+
+   ## throw away everything buffered but not yet parsed
+   def _discard(self):
+      self.buffer_start = len(self.byte_buffer)
         
    def rdt_1_0_send(self, msg_S):
-      p = Packet(self.seq_num, msg_S)
+      p = self._packet(self.seq_num, msg_S)
       self.seq_num += 1
-      self.network.udt_send(p.get_byte_S())
+      self._send_packet(p)
         
-   def rdt_1_0_receive(self):
+   ## @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   def rdt_1_0_receive(self, timeout=0):
       ret_S = None
-      byte_S = self.network.udt_receive()
-      self.byte_buffer += byte_S
+      self._fill(timeout)
       #keep extracting packets - if reordered, could get more than one
       while True:
-         #check if we have received enough bytes
-         if(len(self.byte_buffer) < Packet.length_S_length):
-               return ret_S #not enough bytes to read packet length
-         #extract length of packet
-         length = int(self.byte_buffer[:Packet.length_S_length])
-         if len(self.byte_buffer) < length:
-               return ret_S #not enough bytes to read the whole packet
+         #check if we have received enough bytes for the whole packet
+         length = self._frame_length()
+         if length is None:
+               return ret_S
          #create packet from buffer content and add to return string
-         p = Packet.from_byte_S(self.byte_buffer[0:length])
+         p = self._take_packet(length)
+         if p is None:
+               raise RuntimeError('Cannot initialize Packet: byte_S is corrupt')
          ret_S = p.msg_S if (ret_S is None) else ret_S + p.msg_S
-         #remove the packet bytes from the buffer
-         self.byte_buffer = self.byte_buffer[length:]
          #if this was the last packet, will return on the next iteration
             
     
+   ## send msg_S with the connection's protocol, see protocol_D
+   def send(self, msg_S):
+      if self.protocol.window is not None:
+         self._window_send(msg_S, self.protocol)
+      elif self.protocol.recovery is not None:
+         self._stop_and_wait_send(msg_S, self.protocol)
+      else:
+         self.rdt_1_0_send(msg_S)
+
+   ## @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   # @return the data received in order since the last call, or None
+   def receive(self, timeout=0):
+      if self.protocol.window is not None:
+         return self._window_receive(self.protocol, timeout)
+      elif self.protocol.recovery is not None:
+         return self._stop_and_wait_receive(self.protocol, timeout)
+      return self.rdt_1_0_receive(timeout)
+
+   ## block until everything sent has been acknowledged; stop-and-wait sends already do
+   def flush(self):
+      if self.protocol.window is not None:
+         self._window_flush(self.protocol)
+
+   ## Stop-and-wait sender of rdt 2.1 and 3.0: send msg_S and block until it is acknowledged,
+   # explicitly or by the peer's next data packet
+   # @param protocol: Protocol whose timeout and recovery strategies to use
+   def _stop_and_wait_send(self, msg_S, protocol):
+      p = self._packet(self.seq_num, msg_S)
+      cur_seq_num = self.seq_num
+      transmissions = 0
+      #p acknowledges everything we have received, so any delayed ACK rides along with it
+      self._clear_ack()
+      resend = True
+      while cur_seq_num == self.seq_num:
+         #only timeouts, NAKs and corruption trigger a retransmission - answering every stray
+         #packet with one lets two senders multiply each other's traffic
+         if resend:
+            if transmissions:
+               self.stats.retransmits += 1
+            self._send_packet(p)
+            transmissions += 1
+            initial_time = time.time()
+            rto = protocol.timeout.rto(self)
+            deadline = None if rto is None else initial_time + rto
+            resend = False
+         length = self._frame_length()
+         while length is None and (deadline is None or deadline >= time.time()):
+            if self.network.stop:
+               raise RuntimeError('Connection closed before the packet was acknowledged')
+            self._fill(None if deadline is None else deadline - time.time())
+            length = self._frame_length()
+
+         if length is None:
+            self.stats.timeouts += 1
+            self._event('timeout', cur_seq_num, "timeout: resend data")
+            protocol.timeout.expired(self)
+            resend = True
+            continue
+
+         frame_start = self.buffer_start
+         response_pkt = self._take_packet(length)
+         if response_pkt is None:
+            #could have been our ACK
+            self._discard()
+            resend = protocol.recovery.resend_on_nak
+         #Stale ACK or NAK, e.g. one a delayed ACK already covered
+         elif response_pkt.seq_num < self.seq_num and response_pkt.msg_S in ("ACK", "NAK"):
+            if response_pkt.msg_S == "ACK":
+               self.stats.duplicate_acks += 1
+               self._event('duplicate_ack', response_pkt.seq_num, "duplicate ACK")
+         #Check for previous packet number
+         elif response_pkt.seq_num < self.seq_num:
+            #Resend an ACK to acknowledge received pkt
+            self._send_packet(self._packet(response_pkt.seq_num, "ACK"))
+            resend = protocol.timeout.resend_on_duplicate
+         #Check for ACK
+         elif response_pkt.msg_S == "ACK":
+            #Can move on to sending next packet
+            self._event('ack', self.seq_num, "recieved ACK")
+            #Karn's rule: a retransmitted packet's ACK is ambiguous, so don't time it
+            if transmissions == 1:
+               self._rtt_sample(time.time() - initial_time)
+            self.seq_num += 1
+         #Check for NAK
+         elif response_pkt.msg_S == "NAK":
+            self.stats.naks_received += 1
+            self._event('nak', self.seq_num, "recieved NAK, resend data")
+            self._discard()
+            resend = protocol.recovery.resend_on_nak
+         #Check for the peer's next data packet - it only sends that once it has ours
+         elif response_pkt.seq_num == self.seq_num + 1:
+            self._event('implicit_ack', self.seq_num, "recieved data, implicit ACK")
+            if transmissions == 1:
+               self._rtt_sample(time.time() - initial_time)
+            #leave the data in the buffer for the receiver, which will count it
+            self.buffer_start = frame_start
+            self.stats.packets_received -= 1
+            self.stats.bytes_received -= length
+            self.seq_num += 1
+
+   ## Stop-and-wait receiver of rdt 2.1 and 3.0, acknowledging according to ack_every and ack_delay
+   # @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   # @return the new data in the packets that arrived, or None
+   def _stop_and_wait_receive(self, protocol, timeout=0):
+      ret_S = None
+      self._fill(0 if self._frame_length() is not None else self._ack_wait(timeout))
+      self._flush_ack(due_only=True)
+
+      #Variable for current packet number
+      cur_seq_num = self.seq_num
+
+      #keep extracting packets - if reordered, could get more than one
+      while cur_seq_num == self.seq_num:
+         #check if we have received enough bytes for the whole packet
+         length = self._frame_length()
+         if length is None:
+            break
+         p = self._take_packet(length)
+         #Check if corrupt packet
+         if p is None:
+            protocol.recovery.corrupt(self, self.seq_num)
+         #Check if packet is an ACK or NAK
+         elif p.msg_S == "NAK" or p.msg_S == "ACK":
+            continue
+         #Check for previous packet number
+         elif p.seq_num < self.seq_num:
+            #This means we have already received this packet
+            #So send another ACK about received packet
+            self.stats.duplicates += 1
+            self._event('duplicate', p.seq_num, "duplicate packet, resend ACK")
+            self._send_packet(self._packet(p.seq_num, "ACK"))
+         #Else if packet matches number we are looking for
+         elif p.seq_num == self.seq_num:
+            self._event('deliver', self.seq_num, "data not corrupted, sent ACK")
+            self._delay_ack(self.seq_num)
+            #Increment for next packet number
+            self.seq_num += 1
+            #only new data goes up, a delayed ACK makes duplicates more likely
+            ret_S = p.msg_S if (ret_S is None) else ret_S + p.msg_S
+         #if this was the last packet, will return on the next iteration
+      return ret_S
+
    def rdt_2_1_send(self, msg_S):
-       p = Packet(self.seq_num, msg_S)
-       cur_seq_num = self.seq_num
-       while (cur_seq_num == self.seq_num):
-           
-             self.network.udt_send(p.get_byte_S())
-             message = ''
-
-             while (message == ''):
-                     message = self.network.udt_receive()
-
-             length = int(message[:Packet.length_S_length])
-             
-             self.byte_buffer = message[length:]
-             if not (Packet.corrupt(message[:length])):
-                     response_pkt = Packet.from_byte_S(message[:length])
-                     #Check for previous packet number
-                     if (response_pkt.seq_num < self.seq_num):
-                              #Resend an ACK to acknowledge received pkt
-                              ACK = Packet(response_pkt.seq_num, "ACK")
-                              self.network.udt_send(ACK.get_byte_S())
-                     #Check for ACK
-                     elif (response_pkt.msg_S == "ACK"):
-                              #Can move on to sending next packet
-                              print("recieved ACK")
-                              self.seq_num += 1
-                     #Check for NAK
-                     elif (response_pkt.msg_S == "NAK"):
-                              print("recieved NAK, resend data")
-                              self.byte_buffer = ''
-             else:
-                     self.byte_buffer = ''
+      self._stop_and_wait_send(msg_S, protocol_D['2.1'])
+
+   def rdt_2_1_receive(self, timeout=0):
+      return self._stop_and_wait_receive(protocol_D['2.1'], timeout)
 
-   
-   def rdt_2_1_receive(self):
-       ret_S = None
-       byte_S = self.network.udt_receive()
-       self.byte_buffer += byte_S
-
-       #Variable for current packet number
-       cur_seq_num = self.seq_num
-
-       #keep extracting packets - if reordered, could get more than one
-       while (cur_seq_num == self.seq_num):
-           #check if we have received enough bytes
-           if(len(self.byte_buffer) < Packet.length_S_length):
-               #not enough bytes to read packet length
-               #return ret_S
-               break
-           #extract length of packet
-           length = int(self.byte_buffer[:Packet.length_S_length])
-           if len(self.byte_buffer) < length:
-               #not enough bytes to read the whole packet
-               #return ret_S
-               break
-           #Check if corrupt packet
-           if Packet.corrupt(self.byte_buffer):
-               #If corrupt, send NAK
-               print("data corrupted, sent NAK")
-               NAK = Packet(self.seq_num, "NAK")
-               self.network.udt_send(NAK.get_byte_S())
-
-           #If Packet not corrupt
-           else:
-               #create packet from buffer content and add to return string
-               p = Packet.from_byte_S(self.byte_buffer[0:length])
-
-               #Check if packet is an ACK or NAK
-               if (p.msg_S == "NAK" or p.msg_S == "ACK"):
-                   self.byte_buffer = self.byte_buffer[length:]
-                   continue
-               #Check for previous packet number
-               if (p.seq_num < self.seq_num):
-                   #This means we have already received this packet
-                   #So send another ACK about received packet
-                   ACK = Packet(p.seq_num, "ACK")
-                   print("duplicate packet, resend ACK")
-                   self.network.udt_send(ACK.get_byte_S())
-               #Else if packet matches number we are looking for
-               elif (p.seq_num == self.seq_num):
-                   #NEW PACKET FRICK YEAH
-                   #Send ACK on new packet
-                   print("data not corrupted, sent ACK")
-                   ACK = Packet(self.seq_num, "ACK")
-                   self.network.udt_send(ACK.get_byte_S())
-                   #Increment for next packet number
-                   self.seq_num += 1
-
-               ret_S = p.msg_S if (ret_S is None) else ret_S + p.msg_S
-           #remove the packet bytes from the buffer
-           self.byte_buffer = self.byte_buffer[length:]
-           #if this was the last packet, will return on the next iteration
-       return ret_S
-    
    def rdt_3_0_send(self, msg_S):
-       p = Packet(self.seq_num, msg_S)
-       cur_seq_num = self.seq_num
-       while (cur_seq_num == self.seq_num):
-             self.network.udt_send(p.get_byte_S())
-             message = ''
-             initial_time = time.time()
-             time_allowed = 3
-            
-             while (message == '' and initial_time+time_allowed>=time.time()):
-                     message = self.network.udt_receive()
+      self._stop_and_wait_send(msg_S, protocol_D['3.0'])
 
-             if message =='':
-                 print("timeout: resend data")
-                 continue
-            
-             length = int(message[:Packet.length_S_length])
-             self.byte_buffer = message[length:]
-             if not (Packet.corrupt(message[:length])):
-                     response_pkt = Packet.from_byte_S(message[:length])
-                     #Check for previous packet number
-                     if (response_pkt.seq_num < self.seq_num):
-                              #Resend an ACK to acknowledge received pkt
-                              ACK = Packet(response_pkt.seq_num, "ACK")
-                              self.network.udt_send(ACK.get_byte_S())
-                     #Check for ACK
-                     elif (response_pkt.msg_S == "ACK"):
-                              #Can move on to sending next packet
-                              print("recieved ACK")
-                              self.seq_num += 1
-                     #Check for NAK
-                     elif (response_pkt.msg_S == "NAK"):
-                              print("recieved NAK, resend data")
-                              self.byte_buffer = ''
-             else:
-                     self.byte_buffer = ''
-        
-   def rdt_3_0_receive(self):
-       ret_S = None
-       byte_S = self.network.udt_receive()
-       self.byte_buffer += byte_S
-
-       #Variable for current packet number
-       cur_seq_num = self.seq_num
-
-       #keep extracting packets - if reordered, could get more than one
-       while (cur_seq_num == self.seq_num):
-           #check if we have received enough bytes
-           if(len(self.byte_buffer) < Packet.length_S_length):
-               #not enough bytes to read packet length
-               #return ret_S
-               break
-           #extract length of packet
-           length = int(self.byte_buffer[:Packet.length_S_length])
-           if len(self.byte_buffer) < length:
-               #not enough bytes to read the whole packet
-               #return ret_S
-               break
-           #Check if corrupt packet
-           if Packet.corrupt(self.byte_buffer):
-               print("data corrupted, sent NAK")
-               #If corrupt, send NAK
-               NAK = Packet(self.seq_num, "NAK")
-               self.network.udt_send(NAK.get_byte_S())
-
-           #If Packet not corrupt
-           else:
-               #create packet from buffer content and add to return string
-               p = Packet.from_byte_S(self.byte_buffer[0:length])
-
-               #Check if packet is an ACK or NAK
-               if (p.msg_S == "NAK" or p.msg_S == "ACK"):
-                   self.byte_buffer = self.byte_buffer[length:]
-                   continue
-               #Check for previous packet number
-               if (p.seq_num < self.seq_num):
-                   #This means we have already received this packet
-                   #So send another ACK about received packet
-                   print("duplicate packet, resend ACK")
-                   ACK = Packet(p.seq_num, "ACK")
-                   self.network.udt_send(ACK.get_byte_S())
-               #Else if packet matches number we are looking for
-               elif (p.seq_num == self.seq_num):
-                   #NEW PACKET FRICK YEAH
-                   #Send ACK on new packet
-                   print("data not corrupted, sent ACK")
-                   ACK = Packet(self.seq_num, "ACK")
-                   self.network.udt_send(ACK.get_byte_S())
-                   #Increment for next packet number
-                   self.seq_num += 1
-
-               ret_S = p.msg_S if (ret_S is None) else ret_S + p.msg_S
-           #remove the packet bytes from the buffer
-           self.byte_buffer = self.byte_buffer[length:]
-           #if this was the last packet, will return on the next iteration
-       return ret_S
+   def rdt_3_0_receive(self, timeout=0):
+      return self._stop_and_wait_receive(protocol_D['3.0'], timeout)
+
+   ## pull bytes off the network and split out every complete packet
+   # @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   # @return list of Packets, with None in place of corrupt packets
+   def _collect_packets(self, timeout=0):
+      pkt_L = []
+      self._fill(timeout)
+      length = self._frame_length()
+      while length is not None:
+         pkt_L.append(self._take_packet(length))
+         length = self._frame_length()
+      return pkt_L
+
+   ## send a data packet and (re)start its timer
+   def _window_transmit(self, seq_num):
+      if seq_num in self.timer_D or seq_num in self.lost_S:
+         self.retransmitted_S.add(seq_num)
+         self.stats.retransmits += 1
+         self._event('retransmit', seq_num, "retransmit %d", seq_num)
+         self.lost_S.discard(seq_num)
+      self._send_packet(self.unacked_D[seq_num])
+      self.timer_D[seq_num] = time.time()
+
+   ## stop the timers of packets given up on, to be resent by _window_resend_lost
+   def _window_lost(self, seq_L):
+      for seq_num in seq_L:
+         if seq_num in self.unacked_D:
+            self.timer_D.pop(seq_num, None)
+            self.lost_S.add(seq_num)
+
+   ## resend lost packets, oldest first, as far as the window allows; the rest wait for it to open
+   def _window_resend_lost(self):
+      for seq_num in sorted(self.lost_S):
+         if seq_num >= self.send_base + self._send_window():
+            break
+         self._window_transmit(seq_num)
+
+   ## handle an ACK for seq_num on the sending side of the window
+   # @param window_changed: the ACK advertises a new receive window, so it is no duplicate
+   def _window_ack(self, seq_num, protocol, window_changed=False):
+      if not window_changed and protocol.window.duplicate_ack(self, seq_num):
+         if self.congestion.duplicate(self.next_seq_num - self.send_base):
+            self._event('fast_retransmit', self.send_base, "fast retransmit from %d", self.send_base)
+            self._window_lost(protocol.window.fast_retransmit(self))
+      if seq_num < self.send_base or seq_num >= self.next_seq_num:
+         #stale ACK, or an ACK for something we never sent
+         self.stats.duplicate_acks += 1
+         self._event('duplicate_ack', seq_num, "duplicate ACK %d", seq_num)
+         return
+      self._event('ack', seq_num, "recieved ACK %d", seq_num)
+      if seq_num in self.timer_D and seq_num not in self.retransmitted_S:
+         self._rtt_sample(time.time() - self.timer_D[seq_num])
+      send_base = self.send_base
+      outstanding = len(self.unacked_D)
+      protocol.window.ack(self, seq_num)
+      self.congestion.ack(outstanding - len(self.unacked_D), self.send_base > send_base)
+
+   ## retransmit whatever has timed out
+   def _window_timeouts(self, protocol):
+      rto = protocol.timeout.rto(self)
+      if rto is None:
+         return
+      expired_L = protocol.window.expired(self, time.time(), rto)
+      if expired_L:
+         self.stats.timeouts += len(expired_L) if protocol.window.per_packet_timers else 1
+         self._event('timeout', expired_L[0], "timeout: resend %d packets", len(expired_L))
+         protocol.timeout.expired(self)
+         self.congestion.timeout(self.next_seq_num - self.send_base)
+         self._window_lost(expired_L)
+
+   ## cap a receive timeout so we wake up when the earliest retransmit timer or delayed ACK falls due
+   def _window_deadline(self, timeout, protocol):
+      timeout = self._ack_wait(timeout)
+      rto = protocol.timeout.rto(self)
+      if not self.timer_D or rto is None:
+         return timeout
+      due = max(0, min(self.timer_D.values()) + rto - time.time())
+      return due if timeout is None else min(due, timeout)
+
+   ## process everything that arrived from the network and service the timers
+   # @param timeout: seconds to block waiting for data, see NetworkLayer.udt_receive
+   # @param delivering: the caller hands deliver_L up straight afterwards, so it takes no room
+   #  in the receive window; False for pumps that only make progress on sending
+   def _window_pump(self, protocol, timeout=0, delivering=False):
+      self.delivering = delivering
+      for p in self._collect_packets(self._window_deadline(timeout, protocol)):
+         if p is None:
+            protocol.recovery.corrupt(self, self.rcv_base)
+            continue
+         window_changed = p.window != self.peer_window
+         self.peer_window = p.window
+         if p.msg_S == "ACK":
+            self._window_ack(p.seq_num, protocol, window_changed)
+         elif p.msg_S == "NAK":
+            self.stats.naks_received += 1
+            if protocol.recovery.resend_on_nak and p.seq_num in self.unacked_D:
+               self._window_transmit(p.seq_num)
+         else:
+            protocol.window.data(self, p)
+      self._flush_ack(due_only=True)
+      self._window_timeouts(protocol)
+      self._window_resend_lost()
+      self.delivering = False
+
+   ## @return how many packets past send_base may be in flight
+   def _send_window(self):
+      #a closed receive window still lets one packet through, so if the window update
+      #that reopens it is lost, retransmitting that packet finds out instead
+      return min(self.window_size, max(1, self.peer_window), self.congestion.window())
+
+   def _window_send(self, msg_S, protocol):
+      #block only while the window is full
+      stopped = False
+      while self.next_seq_num >= self.send_base + self._send_window():
+         if stopped:
+            raise RuntimeError('Connection closed before the window opened')
+         #the last pump after the connection closes takes in everything the peer sent
+         stopped = self.network.stop
+         self._window_pump(protocol, None)
+      self.unacked_D[self.next_seq_num] = self._packet(self.next_seq_num, msg_S)
+      self._window_transmit(self.next_seq_num)
+      self.next_seq_num += 1
+
+   def _window_receive(self, protocol, timeout):
+      self._window_pump(protocol, timeout, True)
+      if not self.deliver_L:
+         return None
+      ret_S = ''.join(self.deliver_L)
+      self.deliver_L = []
+      self._window_update()
+      return ret_S
+
+   def _window_flush(self, protocol):
+      stopped = False
+      while self.send_base < self.next_seq_num:
+         if stopped:
+            raise RuntimeError('Connection closed before everything sent was acknowledged')
+         stopped = self.network.stop
+         self._window_pump(protocol, None)
+
+   ## Go-Back-N: returns as soon as the message fits in the window
+   def rdt_gbn_send(self, msg_S):
+      self._window_send(msg_S, protocol_D['gbn'])
+
+   def rdt_gbn_receive(self, timeout=0):
+      return self._window_receive(protocol_D['gbn'], timeout)
+
+   ## block until every message sent with rdt_gbn_send is acknowledged
+   def rdt_gbn_flush(self):
+      self._window_flush(protocol_D['gbn'])
+
+   ## Selective Repeat: returns as soon as the message fits in the window
+   def rdt_sr_send(self, msg_S):
+      self._window_send(msg_S, protocol_D['sr'])
+
+   def rdt_sr_receive(self, timeout=0):
+      return self._window_receive(protocol_D['sr'], timeout)
+
+   ## block until every message sent with rdt_sr_send is acknowledged
+   def rdt_sr_flush(self):
+      self._window_flush(protocol_D['sr'])
+
+   ## send a byte stream of any length, split into mss-sized segments and pipelined with Selective Repeat
+   # @param chunk_iter: iterable of bytes, consumed lazily so the payload never has to be in memory at once
+   def send_stream(self, chunk_iter):
+      for chunk in chunk_iter:
+         for start in range(0, len(chunk), self.mss):
+            #the segment goes out as bytes, one wire byte per payload byte, see Packet
+            self.rdt_sr_send(self.stream_data_B + chunk[start:start+self.mss])
+      self.rdt_sr_send(self.stream_end_S)
+      self.rdt_sr_flush()
+
+   ## reassemble a stream sent with send_stream
+   # @param timeout: give up if no data arrives for this many seconds, None waits forever
+   # @return generator of bytes in stream order, each item all the data that arrived since the last
+   def receive_stream(self, timeout=None):
+      time_of_last_data = time.time()
+      while True:
+         msg_L, self.deliver_L = self.deliver_L, []
+         if msg_L:
+            self._window_update()
+         chunk_L = []
+         for i, msg_S in enumerate(msg_L):
+            if msg_S == self.stream_end_S:
+               #leave anything after the stream for rdt_sr_receive
+               self.deliver_L = msg_L[i+1:] + self.deliver_L
+               if chunk_L:
+                  yield b''.join(chunk_L)
+               return
+            if msg_S[:1] != self.stream_data_S:
+               raise RuntimeError('Unexpected message inside a stream')
+            chunk_L.append(msg_S[1:].encode('utf-8', 'surrogateescape'))
+         if chunk_L:
+            time_of_last_data = time.time()
+            yield b''.join(chunk_L)
+         elif self.network.stop:
+            raise RuntimeError('Connection closed before the end of the stream')
+         elif timeout is not None and time_of_last_data + timeout < time.time():
+            raise RuntimeError('Stream timed out')
+         self._window_pump(protocol_D['sr'], None if timeout is None else max(0, time_of_last_data + timeout - time.time()), True)
                   
         
 if __name__ == '__main__':
@@ -1,54 +1,183 @@
 import argparse
+import logging
+import asyncio
+import concurrent.futures
+import functools
+import re
+import signal
+import sys
+import threading
+import Network
 import RDT
+import AsyncRDT
 import time
 
+logger = logging.getLogger('Server')
 
+##configuration parameters
+ack_delay = 0.05 #hold ACKs this long so they can ride on the reply instead of going out alone
+pipeline_window = 64 #Selective Repeat window for pipelining clients, enough for their replies to stream back
+word_cache_size = 65536 #distinct words makePigLatin remembers
+
+
+vowel_re = re.compile('[aeiouy]')
+
+## words repeat a lot in real text, so each distinct one is converted only once
+@functools.lru_cache(maxsize=word_cache_size)
 def makePigLatin(word):
-    m  = len(word)
-    vowels = "a", "e", "i", "o", "u", "y" 
-    if m<3 or word=="the":
+    if len(word)<3 or word=="the":
         return word
+    #one scan for the first vowel instead of a find() per vowel
+    first = vowel_re.search(word)
+    m = first.start() if first is not None else len(word)
+    if m==0:
+        return word+"way" 
     else:
-        for i in vowels:
-            if word.find(i) < m and word.find(i) != -1:
-                m = word.find(i)
-        if m==0:
-            return word+"way" 
-        else:
-            return word[m:]+word[:m]+"ay" 
+        return word[m:]+word[:m]+"ay" 
 
 def piglatinize(message):
-    essagemay = ""
-    message = message.strip(".")
-    for word in message.split(' '):
-        essagemay += " "+makePigLatin(word)
-    return essagemay.strip()+"."
+    return " ".join(map(makePigLatin, message.strip(".").split(' '))).strip()+"."
+
+## piglatinize a batch of messages, e.g. to hand a process pool one task instead of one per message
+# @return list of converted messages, in order
+def piglatinize_many(msg_L):
+    return [piglatinize(message) for message in msg_L]
+
+
+## serve one client on the asyncio event loop
+# @param timeout: close the session if no new data arrives within this many seconds
+async def piglatin_session(rdt, timeout):
+    try:
+        while True:
+            msg_S = await rdt.rdt_3_0_receive(timeout)
+            if msg_S is None:
+                break
+            await rdt.rdt_3_0_send(piglatinize(msg_S))
+    except ConnectionError:
+        pass #client went away mid-reply
+    rdt.disconnect()
+
+## serve any number of concurrent clients from one thread
+async def serve_asyncio(port, timeout):
+    server = await AsyncRDT.AsyncRDT.start_server(port, lambda rdt: piglatin_session(rdt, timeout))
+    async with server:
+        await server.serve_forever()
+
+## serve one client on its own thread, handing the conversion to a worker pool
+# @param rdt: RDT speaking the client's protocol, see RDT.protocol_D
+# @param timeout: close the session if no new data arrives within this many seconds
+def piglatin_thread_session(rdt, pool, timeout):
+    time_of_last_data = time.time()
+    try:
+        while not rdt.network.stop:
+            msg_S = rdt.receive(time_of_last_data + timeout - time.time())
+            if msg_S is None:
+                if time_of_last_data + timeout < time.time():
+                    break
+                else:
+                    continue
+            time_of_last_data = time.time()
+            rdt.send(pool.submit(piglatinize, msg_S).result())
+    except (OSError, RuntimeError):
+        pass #client went away mid-reply
+    rdt.disconnect()
+
+## serve one pipelining client (see Client.converse_pipelined) over Selective Repeat
+# Requests are 'id:message' lines and each gets an 'id:reply' line back; every batch of
+# requests is converted as soon as it arrives, without waiting for the client to catch up.
+# @param pool: executor to convert on, None converts in this thread
+def piglatin_pipelined_session(rdt, timeout, pool=None):
+    time_of_last_data = time.time()
+    pending_S = '' #a request split across receives
+    try:
+        while not rdt.network.stop:
+            data_S = rdt.rdt_sr_receive(time_of_last_data + timeout - time.time())
+            if data_S is None:
+                if time_of_last_data + timeout < time.time():
+                    break
+                else:
+                    continue
+            time_of_last_data = time.time()
+            *line_L, pending_S = (pending_S + data_S).split('\n')
+            request_L = []
+            for line in line_L:
+                request = line.split(':', 1)
+                #a line without an id cannot be answered, drop it rather than the whole session
+                if len(request) == 2:
+                    request_L.append(request)
+                else:
+                    logger.warning('Server: dropped request without an id: %r', line)
+            msg_L = [msg_S for id_S, msg_S in request_L]
+            reply_L = pool.submit(piglatinize_many, msg_L).result() if pool is not None else piglatinize_many(msg_L)
+            for (id_S, msg_S), reply_S in zip(request_L, reply_L):
+                rdt.rdt_sr_send('%s:%s\n' % (id_S, reply_S))
+    except (OSError, RuntimeError):
+        pass #client went away mid-reply
+    rdt.disconnect()
+
+## serve any number of concurrent clients, each with its own RDT state
+# @param workers: size of the process pool running piglatinize
+# @param pipeline: clients pipeline their requests, see piglatin_pipelined_session
+# @param protocol: what the clients speak otherwise, see RDT.protocol_D
+def serve_multi(port, timeout, workers, pipeline=False, protocol='3.0'):
+    listener = Network.NetworkListener(port)
+    #unwind through the with block on SIGTERM so the pool's worker processes exit too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        while True:
+            rdt = RDT.RDT('server', None, port, network=listener.accept(), ack_delay=ack_delay, window_size=pipeline_window, protocol=protocol)
+            if pipeline:
+                threading.Thread(name='Session', target=piglatin_pipelined_session, args=(rdt, timeout, pool), daemon=True).start()
+            else:
+                threading.Thread(name='Session', target=piglatin_thread_session, args=(rdt, pool, timeout), daemon=True).start()
 
 
 if __name__ == '__main__':
     parser =  argparse.ArgumentParser(description='Pig Latin conversion server.')
     parser.add_argument('port', help='Port.', type=int)
+    parser.add_argument('--asyncio', help='Serve many clients concurrently on an asyncio event loop.', action='store_true')
+    parser.add_argument('--multi', help='Serve many clients concurrently, one thread per client.', action='store_true')
+    parser.add_argument('--workers', help='Worker processes for --multi (default: CPU count).', type=int, default=None)
+    parser.add_argument('--pipeline', help='Serve pipelining clients (Client.py --pipeline) over Selective Repeat.', action='store_true')
+    parser.add_argument('--protocol', help='Protocol version the clients speak, without --asyncio or --pipeline.', choices=list(RDT.protocol_D), default='3.0')
+    parser.add_argument('--transport', help='Run RDT over TCP or straight over UDP, without --asyncio or --multi.', choices=['tcp', 'udp'], default='tcp')
+    parser.add_argument('--coalesce', help='Batch writes, holding packets up to this many seconds (see NetworkLayer.coalesce_delay).', type=float, default=None)
+    parser.add_argument('--log-level', help='Show protocol events down to this level, DEBUG for every packet.', choices=['DEBUG', 'INFO', 'WARNING'], default='INFO')
     args = parser.parse_args()
+    if args.protocol != '3.0' and (args.asyncio or args.pipeline):
+        parser.error('--asyncio always speaks rdt 3.0 and --pipeline Selective Repeat')
+    if args.transport != 'tcp' and (args.asyncio or args.multi):
+        parser.error('--asyncio and --multi accept TCP connections only')
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    Network.NetworkLayer.coalesce_delay = args.coalesce
+    #replies and ACKs to a pipelining client are small packets Nagle would stall, see Client.py
+    Network.NetworkLayer.nodelay = args.pipeline
     
     timeout = 120 #close connection if no new data within 120 seconds
     time_of_last_data = time.time()
-    
-    rdt = RDT.RDT('server', None, args.port)
-    while(True):
-        #try to receiver message before timeout
-        #msg_S = rdt.rdt_2_1_receive()
-        msg_S = rdt.rdt_3_0_receive()
-        if msg_S is None:
-            if time_of_last_data + timeout < time.time():
-                break
-            else:
-                continue
-        time_of_last_data = time.time()
+
+    if args.asyncio:
+        asyncio.run(serve_asyncio(args.port, timeout))
+    elif args.multi:
+        serve_multi(args.port, timeout, args.workers, args.pipeline, args.protocol)
+    elif args.pipeline:
+        piglatin_pipelined_session(RDT.RDT('server', None, args.port, window_size=pipeline_window, transport=args.transport), timeout)
+    else:
+        rdt = RDT.RDT('server', None, args.port, ack_delay=ack_delay, protocol=args.protocol, transport=args.transport)
+        while(True):
+            #try to receiver message before timeout
+            msg_S = rdt.receive(time_of_last_data + timeout - time.time())
+            if msg_S is None:
+                #stop once the client has closed the connection, receive no longer blocks then
+                if time_of_last_data + timeout < time.time() or rdt.network.stop:
+                    break
+                else:
+                    continue
+            time_of_last_data = time.time()
         
-        #convert and reply
-        rep_msg_S = piglatinize(msg_S)
-        print('Converted %s \nto \n%s\n' % (msg_S, rep_msg_S))
-        #rdt.rdt_2_1_send(rep_msg_S)
-        rdt.rdt_3_0_send(rep_msg_S)
+            #convert and reply
+            rep_msg_S = piglatinize(msg_S)
+            print('Converted %s \nto \n%s\n' % (msg_S, rep_msg_S))
+            rdt.send(rep_msg_S)
         
-    rdt.disconnect()
+        rdt.disconnect()
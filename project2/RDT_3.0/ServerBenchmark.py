@@ -0,0 +1,67 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import subprocess
+import sys
+import time
+import Client
+import Network
+import RDT
+
+
+## one client process: connect, convert requests_per_client messages, report
+# @param coalesce: NetworkLayer.coalesce_delay for the client
+def run_client(port, requests_per_client, coalesce, ack_delay, start_evt, done_q):
+    Network.NetworkLayer.coalesce_delay = coalesce
+    with contextlib.redirect_stdout(io.StringIO()):
+        rdt = RDT.RDT('client', 'localhost', port, ack_delay=ack_delay)
+        start_evt.wait()
+        for i in range(requests_per_client):
+            rdt.rdt_3_0_send('A mathematician is a device for turning coffee into theorems %d' % i)
+            msg_S = None
+            while msg_S is None:
+                msg_S = rdt.rdt_3_0_receive(1)
+        rdt.disconnect()
+    done_q.put((requests_per_client, rdt.network.packets_sent, rdt.network.send_calls))
+
+## run client_count concurrent clients against the server
+# @return (requests per second over the whole run, client packets per request, client send calls per request)
+def measure(port, client_count, requests_per_client, coalesce=None, ack_delay=Client.ack_delay):
+    start_evt = multiprocessing.Event()
+    done_q = multiprocessing.Queue()
+    proc_L = [multiprocessing.Process(target=run_client, args=(port, requests_per_client, coalesce, ack_delay, start_evt, done_q))
+              for i in range(client_count)]
+    for p in proc_L:
+        p.start()
+    time.sleep(0.5) #let every client connect before the clock starts
+    start = time.time()
+    start_evt.set()
+    result_L = [done_q.get() for p in proc_L]
+    elapsed = time.time() - start
+    for p in proc_L:
+        p.join()
+    total, packets, calls = [sum(column) for column in zip(*result_L)]
+    return total / elapsed, packets / total, calls / total
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Requests/second of the multi-client Pig Latin server.')
+    parser.add_argument('port', help='Port.', type=int)
+    parser.add_argument('--requests', help='Requests per client.', type=int, default=50)
+    parser.add_argument('--clients', help='Client counts to try.', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--coalesce', help='Batch writes on client and server, holding packets up to this many seconds.', type=float, default=None)
+    parser.add_argument('--ack-delay', help='Client ACK delay; 0 sends each ACK on its own, giving coalescing something to merge.', type=float, default=Client.ack_delay)
+    args = parser.parse_args()
+
+    coalesce_L = [] if args.coalesce is None else ['--coalesce', str(args.coalesce)]
+    server = subprocess.Popen([sys.executable, 'Server.py', str(args.port), '--multi'] + coalesce_L, stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    try:
+        #without coalescing every packet is one send call; the difference is the calls saved
+        print('clients  requests/s  packets/req  sends/req')
+        for client_count in args.clients:
+            print('%7d  %10.1f  %11.2f  %9.2f' % ((client_count,) + measure(args.port, client_count, args.requests, args.coalesce, args.ack_delay)))
+    finally:
+        server.terminate()
+        server.wait()
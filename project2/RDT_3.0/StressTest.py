@@ -0,0 +1,50 @@
+import argparse
+import threading
+import time
+import RDT
+
+
+## push message_count small messages as one burst and time how long the receiver takes to extract them
+# @return (seconds to send, seconds to receive)
+def burst(port, message_count, packet_format):
+    msg_S = 'msg;'
+    server_L = []
+    sent = threading.Event()
+    def server():
+        rdt = RDT.RDT('server', None, port, packet_format=packet_format)
+        sent.wait()
+        time.sleep(0.5) #let the collector drain the socket so the whole burst is buffered
+        start = time.time()
+        received = 0
+        while received < message_count:
+            ret_S = rdt.rdt_1_0_receive(1)
+            if ret_S is not None:
+                received += len(ret_S) // len(msg_S)
+        server_L.append(time.time() - start)
+        rdt.disconnect()
+    server_thread = threading.Thread(name='Server', target=server)
+    server_thread.start()
+    time.sleep(0.2)
+    rdt = RDT.RDT('client', 'localhost', port, packet_format=packet_format)
+    start = time.time()
+    for i in range(message_count):
+        rdt.rdt_1_0_send(msg_S)
+    send_time = time.time() - start
+    sent.set()
+    server_thread.join()
+    rdt.disconnect()
+    return send_time, server_L[0]
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Push bursts of small messages through the RDT receive path.')
+    parser.add_argument('port', help='Port.', type=int)
+    parser.add_argument('--counts', help='Burst sizes to try.', type=int, nargs='+', default=[25000, 50000, 100000])
+    parser.add_argument('--format', help='Packet format.', choices=['string', 'binary'], default='string')
+    args = parser.parse_args()
+
+    #receive time per message should stay flat as the burst grows if extraction is linear
+    print('%8s  %8s  %9s  %14s' % ('messages', 'send s', 'receive s', 'receive us/msg'))
+    for i, message_count in enumerate(args.counts):
+        send_time, receive_time = burst(args.port + i, message_count, args.format)
+        print('%8d  %8.2f  %9.2f  %14.2f' % (message_count, send_time, receive_time, receive_time/message_count*1e6))
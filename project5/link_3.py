@@ -1,3 +1,6 @@
+import collections
+import heapq
+import itertools
 import queue
 import threading
 import time
@@ -54,70 +57,112 @@ class Link:
     # @param node_1_intf: number of the interface on that node
     # @param node_2: node to which data will be transfered
     # @param node_2_intf: number of the interface on that node
-    def __init__(self, node_1, node_1_intf, node_2, node_2_intf):
+    # @param prop_delay: seconds for a bit to cross the link
+    # @param clock: returns the current time in seconds, LinkLayer.attach sets EventScheduler.now
+    def __init__(self, node_1, node_1_intf, node_2, node_2_intf, prop_delay=0, clock=time.time):
         self.node_1 = node_1
         self.node_1_intf = node_1_intf
         self.node_2 = node_2
         self.node_2_intf = node_2_intf
+        self.prop_delay = prop_delay
+        self.clock = clock
+        #frames on the wire in each direction, as (arrival time, frame), in the order they arrive
+        self.in_flight_L = [collections.deque(), collections.deque()]
+        self.wakeup_time = None #when the scheduler next calls tx_pkt, None if it will not
         print('Created link %s' % self.__str__())
 
     ## called when printing the object
     def __str__(self):
         return 'Link %s-%d - %s-%d' % (self.node_1, self.node_1_intf, self.node_2, self.node_2_intf)
 
-    ##transmit a packet between interfaces in each direction
+    ## @return the earliest time tx_pkt has something to do, None if nothing is queued or in flight
+    def next_event_time(self):
+        time_L = [in_flight[0][0] for in_flight in self.in_flight_L if in_flight]
+        for node, intf in ((self.node_1, self.node_1_intf), (self.node_2, self.node_2_intf)):
+            if not node.intf_L[intf].out_queue.empty():
+                time_L.append(node.intf_L[intf].next_avail_time)
+        return min(time_L) if time_L else None
+
+    ##deliver frames that have crossed the link and transmit a packet between interfaces in each direction
     def tx_pkt(self):
-        for (node_a, node_a_intf, node_b, node_b_intf) in \
-        [(self.node_1, self.node_1_intf, self.node_2, self.node_2_intf),
-         (self.node_2, self.node_2_intf, self.node_1, self.node_1_intf)]:
+        now = self.clock()
+        for (in_flight, node_a, node_a_intf, node_b, node_b_intf) in \
+        [(self.in_flight_L[0], self.node_1, self.node_1_intf, self.node_2, self.node_2_intf),
+         (self.in_flight_L[1], self.node_2, self.node_2_intf, self.node_1, self.node_1_intf)]:
             intf_a = node_a.intf_L[node_a_intf]
             intf_b = node_b.intf_L[node_b_intf]
+            while in_flight and in_flight[0][0] <= now:
+                arrival_time, pkt_S = in_flight.popleft()
+                try:
+                    intf_b.put(pkt_S, 'in')
+                except queue.Full:
+                    print('%s: packet lost' % (self))
             if intf_a.out_queue.empty():
                 continue #continue if no packet to transfer
             #otherwise try transmitting the packet
             try:
                 #check if the interface is free to transmit a packet
-                if intf_a.next_avail_time <= time.time():
-
-                    tmp_queue = intf_a.out_queue
-                    size = tmp_queue.qsize()
-                    temp = []
-                    string = ''
-                    lastPos = 0
-                    for i in range(size):
-                        p = tmp_queue.get()
-                        priority =  int(p[5 : 6])
-                        if priority == 1:
-                            temp.insert(lastPos, p)
-                            lastPos += 1
-                        else:
-                            temp.append(p)
-                        string +=  str(temp[i]) + ' '
-                    for i in range(size):
-                        intf_a.out_queue.put(temp[i])
-                    print('Whats in Queue on ', self , ' ' , string)
-                    #transmit the packet
+                if intf_a.next_avail_time <= now:
+                    #the interface's output queue picks the frame to send, see network_3.scheduler_D
+                    print('%s: packets queued on %s %s by priority %s' % (self, node_a, node_a_intf, intf_a.out_queue.counts()))
+                    #transmit the packet: the interface is busy until the last bit is serialized,
+                    #and that bit reaches the far end prop_delay later
                     pkt_S = intf_a.get('out')
-                    intf_b.put(pkt_S, 'in')
-                    #update the next free time of the interface according to serialization delay
-                    pkt_size = len(pkt_S)*8 #assuming each character is 8 bits
-                    intf_a.next_avail_time = time.time() + pkt_size/intf_a.capacity
+                    intf_a.next_avail_time = now + intf_a.serialization_delay(pkt_S)
+                    in_flight.append((intf_a.next_avail_time + self.prop_delay, pkt_S))
                     print('%s: transmitting frame "%s" on %s %s -> %s %s \n' \
                           ' - seconds until the next available time %f\n' \
+                          ' - seconds until it arrives %f\n' \
                           ' - queue size %d' \
-                          % (self, pkt_S, node_a, node_a_intf, node_b, node_b_intf, intf_a.next_avail_time - time.time(), intf_a.out_queue.qsize()))
+                          % (self, pkt_S, node_a, node_a_intf, node_b, node_b_intf, intf_a.next_avail_time - now,
+                             intf_a.next_avail_time + self.prop_delay - now, intf_a.out_queue.qsize()))
                     #for q in intf_a.out_queue:
                     #    print('Things in queue: ', intf_a])
 
                     #print('Things in queue: ', intf_a.out_queue.get())
                 # uncomment the lines below to see waiting time until next transmission
 #                 else:
-#                     print('%s: waiting to transmit packet on %s %s -> %s, %s for another %f milliseconds' % (self, node_a, node_a_intf, node_b, node_b_intf, intf_a.next_avail_time - time.time()))
+#                     print('%s: waiting to transmit packet on %s %s -> %s, %s for another %f milliseconds' % (self, node_a, node_a_intf, node_b, node_b_intf, intf_a.next_avail_time - now))
             except queue.Full:
                 print('%s: packet lost' % (self))
                 pass
 
 
+## A discrete-event scheduler: a priority queue of timestamped events and a virtual clock
+# that jumps from one event to the next, so simulated time costs nothing while nothing happens.
+# Events due at the same time run in the order they were scheduled, which makes every run
+# of a scenario identical.
+class EventScheduler:
+
+    def __init__(self):
+        self.time = 0 #virtual time in seconds
+        self.event_L = [] #heap of (time, sequence number, function, arguments)
+        self.sequence = itertools.count() #breaks ties between events due at the same time
+        self.events_run = 0
+
+    ## @return the virtual time, for use wherever time.time would be called
+    def now(self):
+        return self.time
+
+    ## call fn(*arg_L) at virtual time at_time
+    def schedule_at(self, at_time, fn, *arg_L):
+        heapq.heappush(self.event_L, (max(at_time, self.time), next(self.sequence), fn, arg_L))
+
+    ## call fn(*arg_L) delay seconds from now
+    def schedule(self, delay, fn, *arg_L):
+        self.schedule_at(self.time + delay, fn, *arg_L)
+
+    ## run events in time order until none are left
+    # @param until: stop at this virtual time instead, leaving later events queued
+    def run(self, until=None):
+        while self.event_L and (until is None or self.event_L[0][0] <= until):
+            self.time, sequence, fn, arg_L = heapq.heappop(self.event_L)
+            fn(*arg_L)
+            self.events_run += 1
+        if until is not None:
+            self.time = max(self.time, until)
+
+
 ## An abstraction of the link layer
 class LinkLayer:
 
@@ -139,6 +184,43 @@ class LinkLayer:
         for link in self.link_L:
             link.tx_pkt()
 
+    ## drive the links and the nodes they connect from scheduler instead of from their run threads:
+    # a frame queued for output wakes its link, and a frame queued for input schedules the
+    # receiving node, hosts in udt_receive and routers in process_queues
+    def attach(self, scheduler):
+        for link in self.link_L:
+            link.clock = scheduler.now
+            for node, intf in ((link.node_1, link.node_1_intf), (link.node_2, link.node_2_intf)):
+                receive = node.process_queues if hasattr(node, 'process_queues') else node.udt_receive
+                node.intf_L[intf].on_put = self._on_put_handler(scheduler, link, receive)
+
+    ## @return Interface.on_put for an interface of link whose node handles frames in receive
+    def _on_put_handler(self, scheduler, link, receive):
+        def on_put(in_or_out):
+            if in_or_out == 'in':
+                scheduler.schedule(0, receive)
+            else:
+                self._wake(scheduler, link, scheduler.now())
+        return on_put
+
+    ## make sure link transmits at at_time, unless it is already due to do so earlier
+    def _wake(self, scheduler, link, at_time):
+        if link.wakeup_time is not None and link.wakeup_time <= at_time:
+            return
+        link.wakeup_time = at_time
+        scheduler.schedule_at(at_time, self._tx_event, scheduler, link, at_time)
+
+    ## scheduled tx_pkt: deliver and transmit what is due, then wake again when the next frame
+    # arrives or an interface with frames still queued finishes its current transmission
+    def _tx_event(self, scheduler, link, at_time):
+        if link.wakeup_time != at_time:
+            return #superseded by an earlier wakeup
+        link.wakeup_time = None
+        link.tx_pkt()
+        next_time = link.next_event_time()
+        if next_time is not None:
+            self._wake(scheduler, link, max(next_time, scheduler.now()))
+
     ## thread target for the network to keep transmitting data across links
     def run(self):
         print (threading.currentThread().getName() + ': Starting')
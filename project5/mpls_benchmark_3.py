@@ -0,0 +1,102 @@
+import argparse
+import re
+import timeit
+from network_3 import Router, NetworkPacket, PriorityFIFO
+from link_3 import LinkFrame
+
+
+## the MPLS frame before integer labels, kept as the reference: a string label zero-padded to 20 characters
+class ReferenceMPLSFrame:
+    label_length = 20
+
+    def __init__(self, label, packet):
+        self.label = label
+        self.packet = packet
+
+    def to_byte_S(self):
+        return str(self.label).zfill(self.label_length) + self.packet
+
+    @classmethod
+    def from_byte_S(self, byte_S):
+        return self(byte_S[0 : self.label_length].strip('0'), byte_S[self.label_length : ])
+
+
+## the forwarding path before Router.switch_frame, kept as the reference: every hop parses the
+# frame and packet out, and finds the destination again by a regex over the label
+class ReferenceRouter:
+    ##@param frwd_tbl_D: {in_intf: out_intf} for MPLS frames
+    # @param decap_tbl_D: {dst: out_intf} for MPLS frames to decapsulate
+    def __init__(self, frwd_tbl_D, decap_tbl_D, out_L):
+        self.frwd_tbl_D = frwd_tbl_D
+        self.decap_tbl_D = decap_tbl_D
+        self.out_L = out_L
+
+    def process_frame(self, fr_S, i):
+        fr = LinkFrame.from_byte_S(fr_S)
+        if fr.type_S == 'Network':
+            pkt = NetworkPacket.from_byte_S(fr.data_S)
+            self.process_MPLS_frame(ReferenceMPLSFrame(',' + str(pkt.dst) + ',', pkt.to_byte_S()), i)
+        else:
+            self.process_MPLS_frame(ReferenceMPLSFrame.from_byte_S(fr.data_S), i)
+
+    def process_MPLS_frame(self, m_fr, i):
+        priority = int(NetworkPacket.from_byte_S(m_fr.packet).priority)
+        m_fr_dst = re.search(r'(,\w{1,2},)', m_fr.label, flags=0).group().replace(',', '')
+        if i in self.frwd_tbl_D:
+            fr = LinkFrame('MPLS', m_fr.to_byte_S())
+            self.out_L[self.frwd_tbl_D[i]].put(fr.to_byte_S(), priority=priority)
+        elif m_fr_dst in self.decap_tbl_D:
+            fr = LinkFrame('Network', NetworkPacket.from_byte_S(m_fr.packet).to_byte_S())
+            self.out_L[self.decap_tbl_D[m_fr_dst]].put(fr.to_byte_S(), priority=priority)
+
+
+## a router with one label table entry of each kind: push on interface 0, swap on 1, pop on 2
+def make_router():
+    router = Router(name='RA',
+                    intf_capacity_L=[500]*4,
+                    encap_tbl_D={0: 1},
+                    frwd_tbl_D={(0, 1): (3, 11), (1, 11): (3, 12)},
+                    decap_tbl_D={(2, 12): 3},
+                    max_queue_size=0)
+    router.verbose = False
+    return router
+
+## time forwarding one frame of each kind by the reference path and by switch_frame
+# @return {op: (reference frames/s, switch_frame frames/s)}
+def measure(data_S, number):
+    router = make_router()
+    out_q = router.intf_L[3].out_queue
+    ref_q = PriorityFIFO()
+    reference = ReferenceRouter({0: 3, 1: 3}, {'H3': 3}, [None, None, None, ref_q])
+    pkt_S = NetworkPacket('H3', data_S, 1).to_byte_S()
+    result_D = {}
+    for op, i, ref_fr_S, fr_S in (
+            ('push', 0, 'N' + pkt_S, 'N' + pkt_S),
+            ('swap', 1, 'M' + ReferenceMPLSFrame(',H3,', pkt_S).to_byte_S(), router.label_tbl_D[(0, None)][3] + pkt_S),
+            ('pop', 2, 'M' + ReferenceMPLSFrame(',H3,', pkt_S).to_byte_S(), router.label_tbl_D[(1, 11)][3] + pkt_S)):
+        if op == 'pop':
+            reference.frwd_tbl_D = {} #the last hop decapsulates instead of forwarding
+        def reference_forward():
+            reference.process_frame(ref_fr_S, i)
+            ref_q.get(False)
+        def switch_forward():
+            router.switch_frame(fr_S, i)
+            out_q.get(False)
+        reference_forward()
+        switch_forward()
+        reference_time = timeit.timeit(reference_forward, number=number)
+        switch_time = timeit.timeit(switch_forward, number=number)
+        result_D[op] = (number / reference_time, number / switch_time)
+    return result_D
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Compare MPLS forwarding by label regex with switching on a precompiled label table.')
+    parser.add_argument('--number', help='Frames forwarded per measurement.', type=int, default=100000)
+    parser.add_argument('--sizes', help='Payload sizes in characters.', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print('%6s  %-4s  %14s  %14s  %7s' % ('size', 'op', 'regex frames/s', 'table frames/s', 'speedup'))
+    for size in args.sizes:
+        for op, (reference, switch) in measure('x'*size, args.number).items():
+            print('%6d  %-4s  %14.0f  %14.0f  %6.1fx' % (size, op, reference, switch, switch / reference))
@@ -1,18 +1,179 @@
+import collections
+import heapq
+import itertools
 import queue
 import threading
-import re
 from link_3 import LinkFrame
 
 
+## Base class of the output queues (packet schedulers) of an Interface. Packets are queued per
+# class, the NetworkPacket priority, and a subclass decides which class sends next. Follows
+# queue.Queue, so the threads putting and getting packets can share it.
+class OutputQueue:
+    ## @param maxsize - the maximum number of packets queued over all classes, 0 for no limit
+    #  @param weight_D - {class: weight}, the share of the link a class gets under contention;
+    #  classes not listed weigh 1, and weights must be positive. Ignored by schedulers without weights.
+    def __init__(self, maxsize=0, weight_D=None):
+        self.maxsize = maxsize
+        self.weight_D = weight_D if weight_D is not None else {}
+        for priority, weight in self.weight_D.items():
+            #a class of weight 0 would never earn the credit to send, and it has no finish time
+            if not weight > 0:
+                raise ValueError('weight %r of class %r is not positive' % (weight, priority))
+        self.count_D = {} #class -> packets queued
+        self.size = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def qsize(self):
+        return self.size
+
+    def empty(self):
+        return self.size == 0
+
+    ## @return {class: packets queued}, for reporting
+    def counts(self):
+        with self.lock:
+            return dict(self.count_D)
+
+    ## @param priority - class of pkt
+    # @param block - as for queue.Queue.put
+    def put(self, pkt, block=True, priority=0):
+        with self.not_full:
+            if self.maxsize > 0:
+                if not block and self.size >= self.maxsize:
+                    raise queue.Full
+                self.not_full.wait_for(lambda: self.size < self.maxsize)
+            self._enqueue(pkt, priority)
+            self.count_D[priority] = self.count_D.get(priority, 0) + 1
+            self.size += 1
+            self.not_empty.notify()
+
+    ## @param block - as for queue.Queue.get
+    def get(self, block=True):
+        with self.not_empty:
+            if not block and self.size == 0:
+                raise queue.Empty
+            self.not_empty.wait_for(lambda: self.size > 0)
+            priority, pkt = self._dequeue()
+            self.count_D[priority] -= 1
+            self.size -= 1
+            self.not_full.notify()
+            return pkt
+
+
+## Strict priority: a FIFO per class, the highest class with packets always sends first, so a
+# busy high class starves the rest. A dequeue looks at each class once, whatever the number of
+# packets queued, and packets of one class leave in the order they came.
+class PriorityFIFO(OutputQueue):
+    def __init__(self, maxsize=0, weight_D=None):
+        OutputQueue.__init__(self, maxsize, weight_D)
+        self.fifo_D = {} #class -> deque of packets
+        self.priority_L = [] #keys of fifo_D, highest first
+
+    def _enqueue(self, pkt, priority):
+        fifo = self.fifo_D.get(priority)
+        if fifo is None:
+            fifo = self.fifo_D[priority] = collections.deque()
+            self.priority_L = sorted(self.fifo_D, reverse=True)
+        fifo.append(pkt)
+
+    def _dequeue(self):
+        for priority in self.priority_L:
+            fifo = self.fifo_D[priority]
+            if fifo:
+                return priority, fifo.popleft()
+
+
+## Deficit round robin: classes with packets take turns, each turn adding quantum*weight
+# characters to the class's deficit and sending its packets while they fit in the deficit.
+# Every class gets a share of the link in proportion to its weight, whatever its packet sizes,
+# in O(1) per packet.
+class DeficitRoundRobin(OutputQueue):
+    quantum = 100 #characters a class of weight 1 may send per turn
+
+    def __init__(self, maxsize=0, weight_D=None):
+        OutputQueue.__init__(self, maxsize, weight_D)
+        self.fifo_D = {} #class -> deque of packets
+        self.deficit_D = {} #class -> characters it may still send this turn
+        self.active_L = collections.deque() #classes with packets, the one taking its turn first
+        self.turn_started = False #the class at the front of active_L has had its quantum
+
+    def _enqueue(self, pkt, priority):
+        fifo = self.fifo_D.setdefault(priority, collections.deque())
+        if not fifo:
+            self.active_L.append(priority)
+            self.deficit_D[priority] = 0
+        fifo.append(pkt)
+
+    def _dequeue(self):
+        while True:
+            priority = self.active_L[0]
+            fifo = self.fifo_D[priority]
+            if not self.turn_started:
+                self.deficit_D[priority] += self.quantum * self.weight_D.get(priority, 1)
+                self.turn_started = True
+            if len(fifo[0]) <= self.deficit_D[priority]:
+                pkt = fifo.popleft()
+                self.deficit_D[priority] -= len(pkt)
+                if not fifo:
+                    #an idle class keeps no credit
+                    self.active_L.popleft()
+                    self.turn_started = False
+                return priority, pkt
+            self.active_L.rotate(-1)
+            self.turn_started = False
+
+
+## Weighted fair queueing, self-clocked: every packet is stamped with the virtual time it would
+# finish under bit-by-bit weighted round robin, and the smallest stamp sends first. The virtual
+# time is the stamp of the packet last sent. A heap keeps the stamps, so a packet costs O(log n).
+class WeightedFairQueue(OutputQueue):
+    def __init__(self, maxsize=0, weight_D=None):
+        OutputQueue.__init__(self, maxsize, weight_D)
+        self.heap_L = [] #(finish stamp, sequence number, class, packet)
+        self.sequence = itertools.count() #keeps packets with equal stamps in arrival order
+        self.virtual_time = 0
+        self.last_finish_D = {} #class -> stamp of its last packet queued
+
+    def _enqueue(self, pkt, priority):
+        start = max(self.virtual_time, self.last_finish_D.get(priority, 0))
+        finish = start + len(pkt) / self.weight_D.get(priority, 1)
+        self.last_finish_D[priority] = finish
+        heapq.heappush(self.heap_L, (finish, next(self.sequence), priority, pkt))
+
+    def _dequeue(self):
+        self.virtual_time, sequence, priority, pkt = heapq.heappop(self.heap_L)
+        if not self.heap_L:
+            #idle: the next busy period starts afresh
+            self.virtual_time = 0
+            self.last_finish_D = {}
+        return priority, pkt
+
+
+## Interface scheduler names -> output queue classes
+scheduler_D = {'priority': PriorityFIFO, 'drr': DeficitRoundRobin, 'wfq': WeightedFairQueue}
+
+
 ## wrapper class for a queue of packets
 class Interface:
     ## @param maxsize - the maximum size of the queue storing packets
     #  @param capacity - the capacity of the link in bps
-    def __init__(self, maxsize=0, capacity=500):
+    #  @param scheduler - key of scheduler_D, the order queued packets are sent in
+    #  @param weight_D - {priority: weight} for the weighted schedulers
+    def __init__(self, maxsize=0, capacity=500, scheduler='priority', weight_D=None):
         self.in_queue = queue.Queue(maxsize);
-        self.out_queue = queue.Queue(maxsize);
+        self.out_queue = scheduler_D[scheduler](maxsize, weight_D);
         self.capacity = capacity #serialization rate
         self.next_avail_time = 0 #the next time the interface can transmit a packet
+        #called as on_put(in_or_out) after a packet is queued, so an event scheduler
+        #can wake whoever handles it (see LinkLayer.attach); None when threads poll the queues
+        self.on_put = None
+
+    ## @return seconds the interface takes to put pkt_S on the wire
+    def serialization_delay(self, pkt_S):
+        return len(pkt_S)*8/self.capacity #assuming each character is 8 bits
 
     ##get packet from the queue interface
     # @param in_or_out - use 'in' or 'out' interface
@@ -35,18 +196,26 @@ class Interface:
     # @param pkt - Packet to be inserted into the queue
     # @param in_or_out - use 'in' or 'out' interface
     # @param block - if True, block until room in queue, if False may throw queue.Full exception
-    def put(self, pkt, in_or_out, block=False):
+    # @param priority - NetworkPacket priority of pkt, its class in the output queue
+    def put(self, pkt, in_or_out, block=False, priority=0):
+        if self.on_put is not None:
+            block = False #under a scheduler nothing else runs to make room, so a full queue drops
         if in_or_out == 'out':
             # print('putting packet in the OUT queue')
-            self.out_queue.put(pkt, block)
+            self.out_queue.put(pkt, block, priority)
         else:
             # print('putting packet in the IN queue')
             self.in_queue.put(pkt, block)
+        if self.on_put is not None:
+            self.on_put(in_or_out)
 
+## An MPLS frame: a label, the only header field routers look at, and the NetworkPacket it carries
 class MPLSFrame:
+    ## digits of the label, enough for any 20-bit MPLS label
+    label_length = 7
 
-    label_length = 20
-
+    ##@param label: integer label
+    # @param packet: byte string of the encapsulated NetworkPacket
     def __init__(self, label, packet):
         self.label = label
         self.packet = packet
@@ -63,12 +232,11 @@ class MPLSFrame:
     # @param byte_S: byte string representation of the packet
     @classmethod
     def from_byte_S(self, byte_S):
-        label = byte_S[0 : MPLSFrame.label_length].strip('0')
+        label = int(byte_S[0 : MPLSFrame.label_length])
         packet = byte_S[MPLSFrame.label_length : ]
         return self(label, packet)
 
 
-
 ## Implements a network layer packet
 # NOTE: You will need to extend this class for the packet to include
 # the fields necessary for the completion of this assignment.
@@ -133,7 +301,7 @@ class Host:
         #encapsulate network packet in a link frame (usually would be done by the OS)
         fr = LinkFrame('Network', pkt.to_byte_S())
                 #enque frame onto the interface for transmission
-        self.intf_L[0].put(fr.to_byte_S(), 'out')
+        self.intf_L[0].put(fr.to_byte_S(), 'out', priority=int(priority))
 
     ## receive frame from the link layer
     def udt_receive(self):
@@ -159,27 +327,60 @@ class Host:
 
 ## Implements a multi-interface router
 class Router:
+    ## print every frame switched, turn off to measure forwarding speed
+    verbose = True
 
     ##@param name: friendly router name for debugging
     # @param intf_capacity_L: capacities of outgoing interfaces in bps
-    # @param encap_tbl_D: table used to encapsulate network packets into MPLS frames
-    # @param frwd_tbl_D: table used to forward MPLS frames
-    # @param decap_tbl_D: table used to decapsulate network packets from MPLS frames
+    # @param encap_tbl_D: {in_intf: label} pushed on NetworkPackets arriving on in_intf, which
+    #  are then switched on that label by frwd_tbl_D or decap_tbl_D
+    # @param frwd_tbl_D: {(in_intf, in_label): (out_intf, out_label)} for MPLS frames to swap the label of
+    # @param decap_tbl_D: {(in_intf, in_label): out_intf} for MPLS frames to pop the label off,
+    #  sending the NetworkPacket on
     # @param max_queue_size: max queue length (passed to Interface)
-    def __init__(self, name, intf_capacity_L, encap_tbl_D, frwd_tbl_D, decap_tbl_D, max_queue_size):
+    # @param scheduler: how outgoing interfaces order queued packets, a key of scheduler_D
+    # @param class_weight_D: {priority: weight} for the 'drr' and 'wfq' schedulers
+    def __init__(self, name, intf_capacity_L, encap_tbl_D, frwd_tbl_D, decap_tbl_D, max_queue_size, scheduler='priority', class_weight_D=None):
         self.stop = False #for thread termination
         self.name = name
         #create a list of interfaces
-        self.intf_L = [Interface(max_queue_size, intf_capacity_L[i]) for i in range(len(intf_capacity_L))]
+        self.intf_L = [Interface(max_queue_size, intf_capacity_L[i], scheduler, class_weight_D) for i in range(len(intf_capacity_L))]
         #save MPLS tables
         self.encap_tbl_D = encap_tbl_D
         self.frwd_tbl_D = frwd_tbl_D
         self.decap_tbl_D = decap_tbl_D
+        self.label_tbl_D = self.compile_label_table(encap_tbl_D, frwd_tbl_D, decap_tbl_D)
 
     ## called when printing the object
     def __str__(self):
         return self.name
 
+    ## merge the MPLS tables into the one lookup switch_frame does per frame
+    # @return {(in_intf, in_label): (out_intf, out_label, op, header_S)}, where in_label is None
+    #  for NetworkPackets and out_label None for frames leaving as NetworkPackets, op is 'push',
+    #  'swap', 'pop' or 'route' (push and pop on the same router), and header_S is the link frame
+    #  header, with the label if any, that goes in front of the NetworkPacket on the way out
+    def compile_label_table(self, encap_tbl_D, frwd_tbl_D, decap_tbl_D):
+        switch_D = {key: out for key, out in frwd_tbl_D.items()}
+        switch_D.update({key: (out_intf, None) for key, out_intf in decap_tbl_D.items()})
+        label_tbl_D = {}
+        for (in_intf, in_label), (out_intf, out_label) in switch_D.items():
+            label_tbl_D[(in_intf, in_label)] = self._label_entry(out_intf, out_label, 'pop' if out_label is None else 'swap')
+        for in_intf, label in encap_tbl_D.items():
+            if (in_intf, label) not in switch_D:
+                raise ValueError('%s: label %d pushed on interface %d has no frwd_tbl_D or decap_tbl_D entry' % (self, label, in_intf))
+            out_intf, out_label = switch_D[(in_intf, label)]
+            label_tbl_D[(in_intf, None)] = self._label_entry(out_intf, out_label, 'route' if out_label is None else 'push')
+        return label_tbl_D
+
+    ## @return label table entry for frames leaving on out_intf with out_label
+    def _label_entry(self, out_intf, out_label, op):
+        if out_label is None:
+            header_S = LinkFrame('Network', '').to_byte_S()
+        else:
+            header_S = LinkFrame('MPLS', MPLSFrame(out_label, '').to_byte_S()).to_byte_S()
+        return (out_intf, out_label, op, header_S)
+
     ## look through the content of incoming interfaces and
     # process data and control packets
     def process_queues(self):
@@ -188,90 +389,45 @@ class Router:
             fr_S = self.intf_L[i].get('in') #get frame from interface i
             if fr_S is None:
                 continue # no frame to process yet
-            #decapsulate the packet
-            fr = LinkFrame.from_byte_S(fr_S)
-            pkt_S = fr.data_S
-            #process the packet as network, or MPLS
-            if fr.type_S == "Network":
-                p = NetworkPacket.from_byte_S(pkt_S) #parse a packet out
-                self.process_network_packet(p, i)
-
-            elif fr.type_S == "MPLS":
-
-                # TODO: handle MPLS frames
-                m_fr = MPLSFrame.from_byte_S(pkt_S) #parse a frame out
-                #for now, we just relabel the packet as an MPLS frame without encapsulation
-                #m_fr = p
-                #send the MPLS frame for processing
-                self.process_MPLS_frame(m_fr, i)
-            else:
-                raise('%s: unknown frame type: %s' % (self, fr.type))
+            self.switch_frame(fr_S, i)
 
     ## process a network packet incoming to this router
     #  @param p Packet to forward
     #  @param i Incoming interface number for packet p
     def process_network_packet(self, pkt, i):
-
-        #TODO: encapsulate the packet in an MPLS frame based on self.encap_tbl_Dp
-        #Create MPLS label with ultimate destination
-        label = str(',' + str(pkt.dst) + ',') #self.encap_tbl_D[i])
-
-        pkt_S = pkt.to_byte_S()
-
-        m_fr = MPLSFrame(label, pkt_S)
-        #m_fr_S = m_fr.to_byte_S()
-        #for now, we just relabel the packet as an MPLS frame without encapsulation
-        #m_fr = pkt
-        print('%s: encapsulated packet "%s" as MPLS frame "%s"' % (self, pkt, m_fr))
-        #send the encapsulated packet for processing as MPLS frame
-        self.process_MPLS_frame(m_fr, i)
-
+        self.switch_frame(LinkFrame('Network', pkt.to_byte_S()).to_byte_S(), i)
 
     ## process an MPLS frame incoming to this router
     #  @param m_fr: MPLS frame to process
     #  @param i Incoming interface number for the frame
     def process_MPLS_frame(self, m_fr, i):
-        #TODO: implement MPLS forward, or MPLS decapsulation if this is the last hop router for the path
-            #we can do incoming interface, pkt_dst, and then outgoing interface:
-                #decap_tbl_D = {0 : {H11 : 1}, 1: {H34: 3}, 2: {H17: 4}, 3: {H55: 0}}
-                #better idea: just do pkt dst and outgoing interface {H1: 1}
-
-        #Get the ultimate destination out of the MPLS label
-        print('%s: processing MPLS frame "%s"' % (self, m_fr))
-        m_fr_dst_tmp = re.search('(,\w{1,2},)', m_fr.label, flags=0).group()
-        m_fr_dst = m_fr_dst_tmp.replace(',', '')
-
-        #check to see if we have an interface to forward an MPLS out of
-        if i in self.frwd_tbl_D:
-            out_interface = self.frwd_tbl_D[i]
-            frame_type = 'MPLS'
-
-            try:
-                fr = LinkFrame(frame_type, m_fr.to_byte_S())
-                self.intf_L[out_interface].put(fr.to_byte_S(), 'out', True)
-                print('%s: forwarding frame "%s" from interface %d to %d' % (self, fr, i, out_interface))
-            except queue.Full:
-                print('%s: frame "%s" lost on interface %d' % (self, m_fr, i))
-                pass
-
-        elif m_fr_dst in self.decap_tbl_D:
-        #No out interface for an MPLS
-        #MPLS frame is meant to be decapsulated instead of forwarded
-            out_interface = self.decap_tbl_D[m_fr_dst]
-            frame_type = 'Network'
-
-            pkt = NetworkPacket.from_byte_S(m_fr.packet)
-
-            try:
-                fr = LinkFrame(frame_type, pkt.to_byte_S())
-                self.intf_L[out_interface].put(fr.to_byte_S(), 'out', True)
-                print('%s: forwarding frame "%s" from interface %d to %d' % (self, fr, i, out_interface))
-            except queue.Full:
-                print('%s: frame "%s" lost on interface %d' % (self, pkt, i))
-                pass
+        self.switch_frame(LinkFrame('MPLS', m_fr.to_byte_S()).to_byte_S(), i)
 
+    ## forward a link frame by one label_tbl_D lookup on its incoming interface and label,
+    # replacing the link frame and MPLS headers in front of the NetworkPacket in one go
+    #  @param fr_S: link frame byte string, carrying a NetworkPacket or an MPLS frame
+    #  @param i Incoming interface number for the frame
+    def switch_frame(self, fr_S, i):
+        if fr_S[0 : LinkFrame.type_S_length] == 'M':
+            label = int(fr_S[LinkFrame.type_S_length : LinkFrame.type_S_length + MPLSFrame.label_length])
+            pkt_S = fr_S[LinkFrame.type_S_length + MPLSFrame.label_length : ]
         else:
-            print('DEBUG:   Something went wrong')
+            label = None
+            pkt_S = fr_S[LinkFrame.type_S_length : ]
+        entry = self.label_tbl_D.get((i, label))
+        if entry is None:
+            print('%s: no label table entry for label %s on interface %d, frame "%s" dropped' % (self, label, i, fr_S))
+            return
+        out_intf, out_label, op, header_S = entry
+        #the encapsulated packet's priority decides the order frames leave in
+        priority = int(pkt_S[NetworkPacket.dst_S_length : NetworkPacket.packet_header_length])
+        try:
+            self.intf_L[out_intf].put(header_S + pkt_S, 'out', True, priority)
+            if self.verbose:
+                print('%s: %s label %s -> %s, forwarding frame "%s" from interface %d to %d' % (self, op, label, out_label, header_S + pkt_S, i, out_intf))
+        except queue.Full:
+            print('%s: frame "%s" lost on interface %d' % (self, fr_S, i))
+            pass
 
     ## thread target for the host to keep forwarding data
     def run(self):
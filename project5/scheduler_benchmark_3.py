@@ -0,0 +1,92 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+from network_3 import Router, Host, NetworkPacket, scheduler_D
+from link_3 import Link, LinkLayer, LinkFrame, EventScheduler
+
+
+## A host that records every packet it receives instead of printing it
+class SinkHost(Host):
+    ##@param clock: returns the current time, to stamp arrivals with
+    def __init__(self, addr, clock):
+        Host.__init__(self, addr)
+        self.clock = clock
+        self.arrival_L = [] #(priority, frame characters, seconds since the packet was sent)
+
+    def udt_receive(self):
+        fr_S = self.intf_L[0].get('in')
+        if fr_S is None:
+            return
+        pkt = NetworkPacket.from_byte_S(LinkFrame.from_byte_S(fr_S).data_S)
+        sent_time = float(pkt.data_S.split(':')[0])
+        self.arrival_L.append((int(pkt.priority), len(fr_S), self.clock() - sent_time))
+
+## one host per class sending through router RA, whose link to the sink is the bottleneck
+# @param load_L: offered load of each class as a fraction of the bottleneck capacity
+# @return {class: (offered bps, throughput bps, mean delay s, 95th percentile delay s)}
+def measure(scheduler_S, weight_D, load_L, capacity, size, duration):
+    scheduler = EventScheduler()
+    sink = SinkHost('HS', scheduler.now)
+    source_L = [Host('H%d' % c) for c in range(len(load_L))]
+    router = Router(name='RA',
+                    intf_capacity_L=[capacity*10]*len(load_L) + [capacity],
+                    encap_tbl_D={c: 1 for c in range(len(load_L))},
+                    frwd_tbl_D={},
+                    decap_tbl_D={(c, 1): len(load_L) for c in range(len(load_L))},
+                    max_queue_size=0,
+                    scheduler=scheduler_S,
+                    class_weight_D=weight_D)
+    link_layer = LinkLayer()
+    for c, source in enumerate(source_L):
+        source.intf_L[0].capacity = capacity*10 #the access links never hold a source back
+        link_layer.add_link(Link(source, 0, router, c))
+    link_layer.add_link(Link(router, len(load_L), sink, 0))
+    link_layer.attach(scheduler)
+
+    ## send one packet of class c, stamped with the time, and the next one once its turn comes
+    def send(c, interval):
+        data_S = ('%.9f:' % scheduler.now()).ljust(size, 'x')
+        source_L[c].udt_send('HS', data_S, c)
+        scheduler.schedule(interval, send, c, interval)
+    for c, load in enumerate(load_L):
+        frame_bits = (size + LinkFrame.type_S_length + NetworkPacket.packet_header_length) * 8
+        scheduler.schedule(0, send, c, frame_bits / (load * capacity))
+    scheduler.run(duration)
+
+    result_D = {}
+    for c, load in enumerate(load_L):
+        arrival_L = [a for a in sink.arrival_L if a[0] == c]
+        delay_L = [a[2] for a in arrival_L]
+        result_D[c] = (load * capacity, sum(a[1] for a in arrival_L) * 8 / duration,
+                       statistics.mean(delay_L) if delay_L else float('nan'),
+                       statistics.quantiles(delay_L, n=20)[18] if len(delay_L) > 1 else float('nan'))
+    return result_D
+
+
+if __name__ == '__main__':
+    parser =  argparse.ArgumentParser(description='Per-class throughput and delay of the Interface schedulers on an overloaded link.')
+    parser.add_argument('--schedulers', help='Schedulers to try.', choices=list(scheduler_D), nargs='+', default=list(scheduler_D))
+    parser.add_argument('--loads', help='Offered load of each priority class 0, 1, ... as a fraction of the bottleneck.', type=float, nargs='+', default=[0.5, 0.5, 0.5])
+    parser.add_argument('--weights', help='Weight of each priority class for drr and wfq.', type=float, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--capacity', help='Bottleneck capacity in bps.', type=float, default=10000)
+    parser.add_argument('--size', help='Payload characters per packet.', type=int, default=100)
+    parser.add_argument('--duration', help='Simulated seconds.', type=float, default=600)
+    args = parser.parse_args()
+    if len(args.weights) != len(args.loads):
+        parser.error('give one weight per load')
+    if min(args.weights) <= 0:
+        parser.error('weights must be positive')
+    weight_D = dict(enumerate(args.weights))
+
+    print('%-9s  %5s  %6s  %11s  %14s  %6s  %12s  %11s' % ('scheduler', 'class', 'weight', 'offered bps', 'throughput bps', 'share', 'mean delay s', 'p95 delay s'))
+    for scheduler_S in args.schedulers:
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result_D = measure(scheduler_S, weight_D, args.loads, args.capacity, args.size, args.duration)
+        elapsed = time.time() - start
+        total = sum(throughput for offered, throughput, mean, p95 in result_D.values())
+        for c, (offered, throughput, mean, p95) in sorted(result_D.items(), reverse=True):
+            print('%-9s  %5d  %6g  %11.0f  %14.0f  %6.2f  %12.3f  %11.3f' % (scheduler_S, c, weight_D[c], offered, throughput, throughput / total, mean, p95))
+        print('%-9s  %d simulated seconds in %.2f s' % (scheduler_S, args.duration, elapsed))
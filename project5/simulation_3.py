@@ -1,92 +1,87 @@
 
 from network_3 import Router, Host
-from link_3 import Link, LinkLayer
-import threading
-from time import sleep
-import sys
-from copy import deepcopy
+from link_3 import Link, LinkLayer, EventScheduler
+import time
 
 ##configuration parameters
 router_queue_size = 0 #0 means unlimited
-simulation_time = 20 #give the network sufficient time to execute transfers
+router_scheduler = 'priority' #how routers order queued packets: 'priority', 'drr' or 'wfq'
+class_weight_D = {0: 1, 1: 2} #link share of each priority under 'drr' and 'wfq'
+simulation_time = 20 #simulated seconds to give the network to execute transfers
+prop_delay = 0 #seconds for a bit to cross each link
 
 if __name__ == '__main__':
-    object_L = [] #keeps track of objects, so we can kill their threads at the end
-
     #create network hosts
     host_1 = Host('H1')
-    object_L.append(host_1)
     host_2 = Host('H2')
-    object_L.append(host_2)
     host_3 = Host('H3')
-    object_L.append(host_3)
 
     #create routers and routing tables for connected clients (subnets)
-    encap_tbl_D = {0: 'B', 1: 'C'}    # table used to encapsulate network packets into MPLS frames
-    frwd_tbl_D = {0: 2, 1: 3}     # table used to forward MPLS frames
-    decap_tbl_D = {}    # table used to decapsulate network packets from MPLS frames
+    encap_tbl_D = {0: 1, 1: 2}    # {in_intf: label} pushed on network packets
+    frwd_tbl_D = {(0, 1): (2, 11), (1, 2): (3, 21)}     # {(in_intf, in_label): (out_intf, out_label)} for MPLS frames
+    decap_tbl_D = {}    # {(in_intf, in_label): out_intf} for MPLS frames to decapsulate
     router_a = Router(name='RA',
                               intf_capacity_L=[500,500,500,500],
                               encap_tbl_D = encap_tbl_D,
                               frwd_tbl_D = frwd_tbl_D,
                               decap_tbl_D = decap_tbl_D,
-                              max_queue_size=router_queue_size)
-    object_L.append(router_a)
+                              max_queue_size=router_queue_size,
+                              scheduler=router_scheduler,
+                              class_weight_D=class_weight_D)
 
     encap_tbl_D = {}
-    frwd_tbl_D = {0: 1}
+    frwd_tbl_D = {(0, 11): (1, 12)}
     decap_tbl_D = {}
     router_b = Router(name='RB',
                               intf_capacity_L=[500,500],
                               encap_tbl_D = encap_tbl_D,
                               frwd_tbl_D = frwd_tbl_D,
                               decap_tbl_D = decap_tbl_D,
-                              max_queue_size=router_queue_size)
-    object_L.append(router_b)
+                              max_queue_size=router_queue_size,
+                              scheduler=router_scheduler,
+                              class_weight_D=class_weight_D)
 
     encap_tbl_D = {}
-    frwd_tbl_D = {0: 1}
+    frwd_tbl_D = {(0, 21): (1, 22)}
     decap_tbl_D = {}
     router_c = Router(name='RC',
                               intf_capacity_L=[500,500],
                               encap_tbl_D = encap_tbl_D,
                               frwd_tbl_D = frwd_tbl_D,
                               decap_tbl_D = decap_tbl_D,
-                              max_queue_size=router_queue_size)
-    object_L.append(router_c)
+                              max_queue_size=router_queue_size,
+                              scheduler=router_scheduler,
+                              class_weight_D=class_weight_D)
 
     encap_tbl_D = {}
     frwd_tbl_D = {}
-    decap_tbl_D = {'H3': 2}
+    decap_tbl_D = {(0, 12): 2, (1, 22): 2}
     router_d = Router(name='RD',
                               intf_capacity_L=[500,500,100],
                               encap_tbl_D = encap_tbl_D,
                               frwd_tbl_D = frwd_tbl_D,
                               decap_tbl_D = decap_tbl_D,
-                              max_queue_size=router_queue_size)
-    object_L.append(router_d)
+                              max_queue_size=router_queue_size,
+                              scheduler=router_scheduler,
+                              class_weight_D=class_weight_D)
 
     #create a Link Layer to keep track of links between network nodes
     link_layer = LinkLayer()
-    object_L.append(link_layer)
 
     #add all the links - need to reflect the connectivity in cost_D tables above
-    link_layer.add_link(Link(host_1, 0, router_a, 0))
-    link_layer.add_link(Link(host_2, 0, router_a, 1))
-    link_layer.add_link(Link(router_a, 2, router_b, 0))
-    link_layer.add_link(Link(router_a, 3, router_c, 0))
-    link_layer.add_link(Link(router_b, 1, router_d, 0))
-    link_layer.add_link(Link(router_c, 1, router_d, 1))
-    link_layer.add_link(Link(router_d, 2, host_3, 0))
-
+    link_layer.add_link(Link(host_1, 0, router_a, 0, prop_delay))
+    link_layer.add_link(Link(host_2, 0, router_a, 1, prop_delay))
+    link_layer.add_link(Link(router_a, 2, router_b, 0, prop_delay))
+    link_layer.add_link(Link(router_a, 3, router_c, 0, prop_delay))
+    link_layer.add_link(Link(router_b, 1, router_d, 0, prop_delay))
+    link_layer.add_link(Link(router_c, 1, router_d, 1, prop_delay))
+    link_layer.add_link(Link(router_d, 2, host_3, 0, prop_delay))
 
-    #start all the objects
-    thread_L = []
-    for obj in object_L:
-        thread_L.append(threading.Thread(name=obj.__str__(), target=obj.run))
 
-    for t in thread_L:
-        t.start()
+    #drive the network from a discrete-event scheduler rather than a spinning thread per object,
+    #so the run takes no longer than the events in it and every run forwards the same way
+    scheduler = EventScheduler()
+    link_layer.attach(scheduler)
 
     #create some send events
     for i in range(1):
@@ -97,14 +92,8 @@ if __name__ == '__main__':
         host_1.udt_send('H3', 'MESSAGE_5_FROM_H1' , 1)
         host_2.udt_send('H3', 'MESSAGE_1_FROM_H2' , 1)
 
-    #give the network sufficient time to transfer all packets before quitting
-    sleep(simulation_time)
-
-
-    #join all threads
-    for o in object_L:
-        o.stop = True
-    for t in thread_L:
-        t.join()
+    #give the network sufficient simulated time to transfer all packets before quitting
+    start = time.time()
+    scheduler.run(simulation_time)
 
-    print("All simulation threads joined")
+    print('Simulated %g seconds, %d events, in %.3f seconds' % (scheduler.now(), scheduler.events_run, time.time() - start))